@@ -0,0 +1,67 @@
+import gzip, os, threading
+from service.settings import RESULT_CACHE_DIR, RESULT_CACHE_BYTES
+from service.core.files import atomic_write_bytes
+
+class ResultStore:
+    def __init__(self, version, root=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_BYTES):
+        self.version = version
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, digest):
+        return self.root/f"v{self.version}"/digest[:2]/f"{digest}.json.gz"
+
+    def get(self, digest):
+        path = self._path(digest)
+        try:
+            with gzip.open(path, 'rb') as f:
+                result = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError) as e:
+            print(f">>> [Error] Cached result {digest} is unreadable.({e})")
+            return None
+
+        return result
+
+    def touch(self, digest):
+        try:
+            os.utime(self._path(digest))
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def put(self, digest, result: bytes):
+        path = self._path(digest)
+        try:
+            atomic_write_bytes(path, gzip.compress(result))
+        except OSError as e:
+            print(f">>> [Error] Failed to cache result {digest}.({e})")
+            return False
+
+        self._evict()
+        return path.exists()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for path in self.root.rglob("*.json.gz"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            entries.sort(key=lambda e: e[0])
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
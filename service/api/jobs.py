@@ -0,0 +1,146 @@
+import asyncio, time, uuid
+from collections import OrderedDict
+from service.settings import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RETENTION
+from service.api.records import split_result, decode_json
+
+class QueueFullError(Exception):
+    pass
+
+class ResultExpiredError(Exception):
+    pass
+
+class Job:
+    def __init__(self, key, file_url, timeout, correction, store):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.file_url = file_url
+        self.timeout = timeout
+        self.correction = correction
+        self.status = "queued"
+        self.pages_done = 0
+        self.total_pages = 0
+        self.records = []
+        self.result_key = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._store = store
+        self._updated = asyncio.Event()
+
+    def progress(self, pages_done, total_pages):
+        self.pages_done = pages_done
+        self.total_pages = total_pages
+
+    def push(self, kind, record):
+        self.records.append((kind, record))
+        self._notify()
+
+    def finish(self, result_key, result=None):
+        self.result_key = result_key
+        self.result = result
+        self.records = []
+        self._notify()
+
+    async def load_result(self):
+        if self.result is not None:
+            return self.result
+        return await asyncio.to_thread(self._store.get, self.result_key)
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def iter_records(self):
+        index = 0
+        decoded = None
+        while True:
+            updated = self._updated
+            records = self.records
+            if self.result_key is not None:
+                if decoded is None:
+                    result = await self.load_result()
+                    if result is None:
+                        raise ResultExpiredError(f"Result of job {self.id} is no longer cached.")
+                    decoded = split_result(decode_json(result))
+                records = decoded
+            while index < len(records):
+                yield records[index]
+                index += 1
+            if self.status in ("done", "failed"):
+                return
+            await updated.wait()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "pages_done": self.pages_done,
+            "total_pages": self.total_pages,
+            "correction": self.correction,
+            "error": self.error,
+            "s3_url": self.file_url,
+        }
+
+class JobQueue:
+    def __init__(self, handler, store, workers=JOB_WORKERS, maxsize=JOB_QUEUE_SIZE, retention=JOB_RETENTION):
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.maxsize = maxsize
+        self.retention = retention
+        self.jobs = OrderedDict()
+        self.active = {}
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def submit(self, key, file_url, timeout, correction):
+        if key in self.active:
+            return self.active[key]
+
+        job = Job(key, file_url, timeout, correction, self.store)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.maxsize} pending).")
+
+        self.active[key] = job
+        self.jobs[job.id] = job
+        self._evict()
+
+        return job
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(self.jobs) - self.retention)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            try:
+                await self.handler(job)
+                job.status = "done"
+            except Exception as e:
+                print(f">>> [Error] Job {job.id} failed: {e}", flush=True)
+                job.error = "Processing failed"
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                job._notify()
+                self.active.pop(job.key, None)
+                self._queue.task_done()
@@ -1,82 +1,153 @@
 from fastapi import FastAPI, HTTPException
 from fastapi import status
-from pathlib import Path
+from contextlib import asynccontextmanager
+from typing import Literal
 import os, hashlib, asyncio
-from service.api.services import extract_infos_from_pdf
+from service.api.records import assemble_result, encode_json, result_key, PIPELINE_VERSION
+from service.api.workers import InferencePool
+from service.settings import CORRECTION_MODE
+from service.api.cache import ResultStore
+from service.core.checkpoint import bytes_digest
+from service.core.raster import spool_pdf
 from service.api.models import S3model
+from service.api.jobs import JobQueue, QueueFullError, ResultExpiredError
 from service.core.s3 import download_file_from_presigned_url
-from fastapi.responses import JSONResponse
-from concurrent.futures import ThreadPoolExecutor
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+result_store = ResultStore(PIPELINE_VERSION)
+inference_pool = InferencePool()
+
+async def process_job(job):
+    spool_path = None
+
+    try:
+        print(">>> [INFO] Downloading file...", flush=True)
+        data = await asyncio.to_thread(download_file_from_presigned_url, job.file_url, None, job.timeout)
+
+        digest = await asyncio.to_thread(bytes_digest, data)
+        cache_key = result_key(digest, job.correction)
+        if await asyncio.to_thread(result_store.touch, cache_key):
+            print(">>> [INFO] This file has already been processed", flush=True)
+            job.finish(cache_key)
+            return
+
+        spool_path = await asyncio.to_thread(spool_pdf, data)
+        del data
+
+        print(">>> [INFO] Processing...", flush=True)
+        await inference_pool.run(job, spool_path, digest)
+
+        result = encode_json(assemble_result(job.records))
+        job.finish(cache_key, result)
+        try:
+            if await asyncio.to_thread(result_store.put, cache_key, result):
+                job.finish(cache_key)
+        except Exception as e:
+            print(f">>> [Error] Failed to cache result {cache_key}.({e})", flush=True)
+        print(">>> [INFO] Processing done", flush=True)
+
+    finally:
+        if spool_path is not None:
+            print(">>> [INFO] Cleaning spooled file...", flush=True)
+            try:
+                os.remove(spool_path)
+            except OSError as e:
+                print(f"Error deleting file {spool_path}: {e}", flush=True)
+
+job_queue = JobQueue(process_job, result_store)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    inference_pool.start()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    inference_pool.stop()
 
 app = FastAPI(
     title="DOCent OCR API",
     description="OCR API server for DOCent",
     version="1.0",
+    lifespan=lifespan,
 )
 
 @app.get("/")
 def read_root():
     return {"status": "ok"}
 
-processed_files = set()
-processing_files = set()
+def _format_record(kind, record, fmt):
+    if kind == "matches":
+        record = {"matches": record}
+    data = encode_json(record)
+    if fmt == "sse":
+        return b"event: " + kind.encode() + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
+
+async def _stream_job(job, fmt):
+    try:
+        async for kind, record in job.iter_records():
+            yield _format_record(kind, record, fmt)
+    except ResultExpiredError as e:
+        print(f">>> [INFO] {e}", flush=True)
+        yield _format_record("error", {"error": "Result expired"}, fmt)
+        return
+
+    if job.status == "failed":
+        yield _format_record("error", {"error": "Processing failed"}, fmt)
 
-gpu_lock = asyncio.Lock()
-executor = ThreadPoolExecutor(max_workers=1)
+def _stream_response(job, fmt):
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return StreamingResponse(_stream_job(job, fmt), media_type=media_type,
+                             headers={"X-Job-Id": job.id, "Cache-Control": "no-cache"})
 
-@app.post("/pages", status_code=status.HTTP_201_CREATED)
+@app.post("/pages", status_code=status.HTTP_202_ACCEPTED)
 async def read_pdf(bucket: S3model):
-    filename = hashlib.sha256((bucket.file_url.split('Faws4')[0]).encode()).hexdigest() + ".pdf"
-    temp_path = Path(__file__).parent.parent.parent/"data"/"temp"/filename
+    correction = bucket.correction or CORRECTION_MODE
+    key = hashlib.sha256((bucket.file_url.split('Faws4')[0]).encode()).hexdigest() + "-" + correction
 
-    if filename in processed_files:
-        print(">>> [INFO] This file has already been processed", flush=True)
-        return JSONResponse(
-            status_code = status.HTTP_200_OK,
-            content = {"message": "This file has already been processed.",
-                       "s3_url": bucket.file_url}
-        )
+    try:
+        job = job_queue.submit(key, bucket.file_url, bucket.timeout, correction)
+    except QueueFullError as e:
+        print(f">>> [INFO] {e}", flush=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Server is busy. Retry later.",
+                            headers={"Retry-After": "30"})
 
-    if filename in processing_files:
-        print(">>> [INFO] This file has been processing", flush=True)
-        return JSONResponse(
-            status_code = status.HTTP_200_OK,
-            content = {"message": "This file has been processing.",
-                       "s3_url": bucket.file_url}
-        )
+    if bucket.stream is not None:
+        return _stream_response(job, bucket.stream)
 
-    processing_files.add(filename)
+    return job.to_dict()
 
-    temp_path.parent.mkdir(parents=True, exist_ok=True)
+@app.get("/jobs/{job_id}")
+async def read_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
 
-    try:
-        print(">>> [INFO] Downloading file...", flush=True)
-        await asyncio.to_thread(download_file_from_presigned_url, bucket.file_url, temp_path)
-        print(">>> [INFO] Waiting a GPU lock...", flush=True)
-        async with gpu_lock:
-            print(">>> [INFO] GPU lock acquired. Processing...", flush=True)
-            output = await asyncio.get_running_loop().run_in_executor(
-                None,
-                extract_infos_from_pdf,
-                str(temp_path)
-            )
-
-        processed_files.add(filename)
-        print(">>> [INFO] Processing done", flush=True)
+    return job.to_dict()
 
-        return output
+@app.get("/jobs/{job_id}/result")
+async def read_job_result(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
 
-    except Exception as e:
-        print(f"Error processing {filename}: {e}", flush=True)
+    if job.status == "failed":
         raise HTTPException(status_code=500, detail="Processing failed")
 
-    finally:
-        print(">>> [INFO] Cleaning temporary files...", flush=True)
-        if filename in processing_files:
-            processing_files.remove(filename)
+    if job.status != "done":
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.to_dict())
 
-        if temp_path.exists():
-            try:
-                os.remove(temp_path)
-            except OSError as e:
-                print(f"Error deleting file {filename}: {e}", flush=True)
\ No newline at end of file
+    result = await job.load_result()
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Result expired")
+
+    return Response(content=result, media_type="application/json")
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job_result(job_id: str, format: Literal["ndjson", "sse"] = "ndjson"):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    return _stream_response(job, format)
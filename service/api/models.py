@@ -1,5 +1,8 @@
 from pydantic import BaseModel
+from typing import Literal, Optional
 
 class S3model(BaseModel):
     file_url: str
-    timeout: int
\ No newline at end of file
+    timeout: int
+    stream: Optional[Literal["ndjson", "sse"]] = None
+    correction: Optional[Literal["sentence", "line"]] = None
\ No newline at end of file
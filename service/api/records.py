@@ -0,0 +1,71 @@
+import orjson
+from typing import List, TypedDict
+from service.settings import TEXT_LAYER
+
+PIPELINE_VERSION = "2"
+CORRECTION_MODES = ("sentence", "line")
+
+class FigureRecord(TypedDict):
+    page_num: int
+    figure_box: List[float]
+    figure_type: str
+
+class PageRecord(TypedDict):
+    page_num: int
+    text: str
+    figures: List[FigureRecord]
+
+class PageText(TypedDict):
+    page_num: int
+    text: str
+
+class MatchRecord(TypedDict):
+    figure_box: List[float]
+    figure_page: int
+    page_num: int
+    raw_text: str
+    figure_text: str
+    text_box: List[float]
+
+class DocumentResult(TypedDict):
+    pages: List[PageText]
+    figures: List[FigureRecord]
+    matches: List[MatchRecord]
+
+def encode_json(obj) -> bytes:
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def decode_json(data):
+    return orjson.loads(data)
+
+def result_key(digest, correction, text_layer=TEXT_LAYER):
+    return f"{digest}-{correction}-{text_layer}"
+
+def checkpoint_key(digest, correction, text_layer=TEXT_LAYER):
+    return f"{result_key(digest, correction, text_layer)}-v{PIPELINE_VERSION}"
+
+def assemble_result(records) -> DocumentResult:
+    text_result = []
+    figure_result = []
+    pair_result = []
+    for kind, record in records:
+        if kind == "page":
+            figure_result.extend(record['figures'])
+            text_result.append({'page_num': record['page_num'], 'text': record['text']})
+        else:
+            pair_result = record
+
+    return {'pages': text_result, 'figures': figure_result, 'matches': pair_result}
+
+def split_result(final_result: DocumentResult):
+    figures_by_page = {}
+    for figure in final_result['figures']:
+        figures_by_page.setdefault(figure['page_num'], []).append(figure)
+
+    records = [("page", {'page_num': page['page_num'],
+                         'text': page['text'],
+                         'figures': figures_by_page.get(page['page_num'], [])})
+               for page in final_result['pages']]
+    records.append(("matches", final_result['matches']))
+
+    return records
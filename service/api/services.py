@@ -1,64 +1,20 @@
-from service.core.layout import layout_detection, det_debug
-from service.core.ocr import ocr
-from service.core.crop import crop_image_by_bbox
-from service.core.post import correct, correct_segmentation_and_typos
-from service.core.graph import build_document_graph, load_and_transform_data, create_reference_pairs
-from service.models.predict import predict_from_text
-from pdf2image import convert_from_path
+from service.core.layout import iter_layout_detection, det_debug
+from service.core.ocr import ocr_batch
+from service.core.crop import crop_image_by_bbox, PageStore
+from service.core.raster import PdfRasterizer, count_pages, is_pdf_bytes
+from service.core.textlayer import TextLayer
+from service.core.checkpoint import CheckpointStore, source_digest
+from service.core.post import correct, correct_segmentation_and_typos, segmentation_cache_info
+from service.core.graph import match_reference_pairs
+from service.models.predict import predict_from_texts, prefilter_skip_rate, prefilter_stats
 from pathlib import Path
-import os, json, spacy, time, fitz, pysbd
-import concurrent.futures
-from functools import partial
+import os, time, pysbd
+from service.settings import CORRECTION_MODE, TEXT_LAYER
+from service.api.records import CORRECTION_MODES, assemble_result, checkpoint_key
 from config import debug
 
-nlp = spacy.load("en_core_web_lg")
 seg = pysbd.Segmenter(language="en", clean=False)
 
-def _convert_page_worker(page_num, pdf_path, output_folder, dpi, use_cropbox):
-    try:
-        image = convert_from_path(
-            pdf_path,
-            dpi=dpi,
-            first_page=page_num,
-            last_page=page_num,
-            use_cropbox=use_cropbox,
-            grayscale=True
-        )[0]
-        file_name = f"page_{page_num}.png"
-        save_path = os.path.join(output_folder, file_name)
-        image.save(save_path, "PNG")
-        return save_path
-    except Exception:
-        print(f">>> [Error] Page {page_num} failed to convert to PNG.")
-        return None
-
-def _convert_pdf_to_png(pdf_path: str, output_folder: str = None):
-    if not os.path.exists(pdf_path):
-        print(">>> [Error] File doesn't exist.")
-        return
-
-    folder_name = os.path.basename(pdf_path).split(".")[0]
-    if output_folder is None:
-        output_folder = Path(__file__).parent.parent.parent/'data'/'temp'/folder_name
-
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    try:
-        with fitz.open(pdf_path) as doc:
-            page_count = doc.page_count
-    except Exception:
-        print(f">>> [Error] Fail to convert PDF to PNG.")
-        return
-
-    dpi = 300
-    use_cropbox = True
-
-    worker = partial(_convert_page_worker, pdf_path=pdf_path, output_folder=output_folder, dpi=dpi, use_cropbox=use_cropbox)
-
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        list(executor.map(worker, range(1, page_count+1)))
-
 import re
 def find_start_line_for_string(lines, search_string):
     pattern = r'\s*'.join(re.escape(char) for char in search_string.replace(" ", ""))
@@ -92,113 +48,149 @@ def find_start_in_line(line, search_string):
 
     return start_index
 
-def extract_infos_from_pdf(pdf_path: str):
-    folder_name = os.path.basename(pdf_path).split(".")[0]
+def _recognize_texts(texts, page_index, page_images, text_layer=None):
+    outputs = [None] * len(texts)
+
+    page_words = text_layer.page_words(page_index) if text_layer is not None else None
+    if page_words is not None:
+        outputs = [text_layer.box_lines(page_words, text['coordinate']) for text in texts]
+
+    ocr_indices = [i for i, output in enumerate(outputs) if output is None]
+    if ocr_indices:
+        page_image = page_images.get(page_index)
+        ocr_outputs = ocr_batch([crop_image_by_bbox(page_image, texts[i]['coordinate']) for i in ocr_indices])
+        for i, output in zip(ocr_indices, ocr_outputs):
+            outputs[i] = output
+
+    return outputs
+
+def _extract_page_text(page, page_images, correction=CORRECTION_MODE, text_layer=None):
+    page_text = ""
+    texts = [t for t in page['boxes'] if t['label'] == 'text']
+
+    sentence_sources = []
+    outputs = _recognize_texts(texts, page['page_index'], page_images, text_layer)
+    for text, output in zip(texts, outputs):
+        try:
+            lines = correct(output, correct_lines=correction == "line")
+        except Exception:
+            lines = [""]
+        paragraph = ' '.join(lines)
+
+        if paragraph != "":
+            paragraph = paragraph.replace("Eq.", "EqⒹ")
+            sentences = seg.segment(paragraph)
+            sentences = [s.replace("EqⒹ", "Eq.") for s in sentences]
+            for sentence in sentences:
+                if correction == "sentence":
+                    sentence = correct_segmentation_and_typos(sentence)
+                sentence = sentence.replace("E q", "Eq")
+                sentence_sources.append((sentence, text, lines))
+
+        paragraph = paragraph.replace("EqⒹ", "Eq.")
+        page_text += paragraph
+
+    predict_outputs = predict_from_texts([sentence for sentence, _, _ in sentence_sources])
+    for (_, text, lines), predict_output in zip(sentence_sources, predict_outputs):
+        if predict_output.ref_info:
+            coord = text['coordinate']
+            height = (coord[3] - coord[1])/len(lines)
+            if 'ref_info' not in text:
+                text['ref_info'] = []
+            for ref_info in predict_output.ref_info:
+                line_no = find_start_line_for_string(lines, ref_info)
+                num_char = len(lines[line_no])
+                avg_char_width = (coord[2] - coord[0])/num_char
+                new_coord = [coord[0]+find_start_in_line(lines[line_no], ref_info)*avg_char_width,
+                             coord[1]+line_no*height,
+                             coord[0]+(find_start_in_line(lines[line_no], ref_info)+len(ref_info))*avg_char_width,
+                             coord[1]+(line_no+1)*height]
+                text['ref_info'].append({'figure_text': ref_info,
+                                         'text_box': new_coord,
+                                         'raw_text': predict_output.raw_texts,
+                                         'section_info': predict_output.section_info})
+
+    return page_text
+
+def iter_pages_from_pdf(source, digest=None, correction=CORRECTION_MODE, page_range=None):
+    if correction not in CORRECTION_MODES:
+        raise ValueError(f"Unknown correction mode: {correction}")
+
+    if digest is None:
+        digest = source_digest(source)
+    checkpoints = CheckpointStore(checkpoint_key(digest, correction))
+    checkpoints.prune()
+
+    rasterizer = PdfRasterizer(source, page_range=page_range)
+    page_images = PageStore(rasterizer)
+    text_layer = TextLayer(source) if TEXT_LAYER == "auto" else None
+    prefilter_before = prefilter_stats.copy()
+    cache_before = segmentation_cache_info()
+
+    try:
+        for page in iter_layout_detection(page_images, checkpoints, page_range):
+            boxes = page['boxes']
+            figures = [{'page_num': page['page_index'],
+                        'figure_box': f['coordinate'],
+                        'figure_type': f['label']}
+                       for f in boxes if f['label'] in ['image', 'table', 'figure', 'chart', 'algorithm', 'display_formula']]
+
+            saved = checkpoints.load("text", page['page_index'])
+            if saved is not None:
+                for i, ref_info in saved['ref_info'].items():
+                    boxes[int(i)]['ref_info'] = ref_info
+                page_text = saved['text']
+            else:
+                page_text = _extract_page_text(page, page_images, correction, text_layer)
+                checkpoints.save("text", page['page_index'], {
+                    'text': page_text,
+                    'ref_info': {i: box['ref_info'] for i, box in enumerate(boxes) if 'ref_info' in box}
+                })
+
+            yield page, {'page_num': page['page_index'], 'text': page_text, 'figures': figures}
+
+        print(f">>> [INFO] Reference pre-filter skip rate: {prefilter_skip_rate(prefilter_before):.1%}", flush=True)
+        print(f">>> [INFO] Segmentation cache: {segmentation_cache_info(cache_before)}", flush=True)
+
+    finally:
+        page_images.clear()
+        rasterizer.close()
+        if text_layer is not None:
+            text_layer.close()
 
-    _convert_pdf_to_png(pdf_path)
-    layout_detection(pdf_path)
+def iter_infos_from_pdf(source, progress=None, digest=None, correction=CORRECTION_MODE):
+    if digest is None:
+        digest = source_digest(source)
+    folder_name = digest[:16] if is_pdf_bytes(source) else os.path.basename(source).split(".")[0]
+    total_pages = count_pages(source)
 
     try:
-        filename = os.path.basename(pdf_path).split(".")[0] + ".json"
-        with open(Path(__file__).parent.parent.parent/'data'/'temp'/filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        layout_pages = []
+        for page, record in iter_pages_from_pdf(source, digest, correction):
+            layout_pages.append(page)
+            if progress is not None:
+                progress(len(layout_pages), total_pages)
 
-        pages = data['pages']
+            yield "page", record
 
-        text_result = []
-        figure_result = []
-        for page in pages:
-            page_text = ""
-            boxes = page['boxes']
-            texts = [t for t in boxes if t['label'] == 'text']
-            figures = [f for f in boxes if f['label'] in ['image', 'table', 'figure', 'chart', 'algorithm', 'display_formula']]
-
-            for text in texts:
-                coord = text['coordinate']
-                filename = "page_" + str(page['page_index'] + 1) + ".png"
-                path = Path(__file__).parent.parent.parent/'data'/'temp'/folder_name/filename
-                output = ocr(crop_image_by_bbox(str(path), coord))
-                try:
-                    lines = correct(output[0])
-                except Exception:
-                    lines = [""]
-                paragraph = ' '.join(lines)
-
-                if paragraph != "":
-                    height = (coord[3] - coord[1])/len(lines)
-                    paragraph = paragraph.replace("Eq.", "EqⒹ")
-                    sentences = seg.segment(paragraph)
-                    sentences = [s.replace("EqⒹ", "Eq.") for s in sentences]
-                    for sentence in sentences:
-                        sentence = correct_segmentation_and_typos(sentence)
-                        sentence = sentence.replace("E q", "Eq")
-                        predict_output, _, _ = predict_from_text(sentence)
-                        if predict_output.ref_info:
-                            if 'ref_info' not in text:
-                                text['ref_info'] = []
-                            for ref_info in predict_output.ref_info:
-                                line_no = find_start_line_for_string(lines, ref_info)
-                                num_char = len(lines[line_no])
-                                avg_char_width = (coord[2] - coord[0])/num_char
-                                new_coord = [coord[0]+find_start_in_line(lines[line_no], ref_info)*avg_char_width,
-                                             coord[1]+line_no*height,
-                                             coord[0]+(find_start_in_line(lines[line_no], ref_info)+len(ref_info))*avg_char_width,
-                                             coord[1]+(line_no+1)*height]
-                                text['ref_info'].append({'figure_text': ref_info,
-                                                         'text_box': new_coord,
-                                                         'raw_text': predict_output.raw_texts,
-                                                         'section_info': predict_output.section_info})
-
-                paragraph = paragraph.replace("EqⒹ", "Eq.")
-                page_text += paragraph
-
-            for figure in figures:
-                figure_result.append({'page_num': page['page_index'],
-                                      'figure_box': figure['coordinate'],
-                                      'figure_type': figure['label']})
-
-            page_data = {'page_num': page['page_index'], 'text': page_text}
-            text_result.append(page_data)
-
-        graph = build_document_graph(load_and_transform_data(data))
-        pairs = create_reference_pairs(graph)
-
-        pair_result = []
-        for pair in pairs:
-            pair_result.append({
-                'figure_box': pair['ref']['bbox'],
-                'figure_page': pair['ref']['page'],
-                'page_num': pair['page'],
-                'raw_text': pair['raw_text'],
-                'figure_text': pair['figure_text'],
-                'text_box': pair['text_box']
-            })
-
-        folder_name = os.path.basename(pdf_path).split(".")[0]
-        final_result = {'pages': text_result, 'figures': figure_result, 'matches': pair_result}
-
-        det_debug(final_result, folder_name)
-
-        result_json = json.dumps(final_result, ensure_ascii=False, indent=4)
-
-        return result_json
-
-    except FileNotFoundError:
-        print(">>> [Error] Structured json file not found.")
+        pair_result = match_reference_pairs(layout_pages)
+
+        if debug:
+            rasterizer = PdfRasterizer(source)
+            det_debug({'matches': pair_result}, PageStore(rasterizer), folder_name)
+            rasterizer.close()
+        CheckpointStore(checkpoint_key(digest, correction)).clear()
+
+        yield "matches", pair_result
 
     finally:
-        filename = os.path.basename(pdf_path).split(".")[0] + ".json"
-        folder_name = os.path.basename(pdf_path).split(".")[0]
-        if not debug:
-            os.remove(Path(__file__).parent.parent.parent/'data'/'temp'/filename)
-            for file_name in os.listdir(Path(__file__).parent.parent.parent/'data'/'temp'/folder_name):
-                file_path = os.path.join(Path(__file__).parent.parent.parent/'data'/'temp'/folder_name, file_name)
-                os.remove(file_path)
-            for file_name in os.listdir(Path(__file__).parent.parent.parent/'data'/'debug'):
-                file_path = os.path.join(Path(__file__).parent.parent.parent/'data'/'debug', file_name)
-                os.remove(file_path)
-
-            os.removedirs(Path(__file__).parent.parent.parent/'data'/'temp'/folder_name)
+        debug_path = Path(__file__).parent.parent.parent/'data'/'debug'
+        if not debug and debug_path.exists():
+            for file_name in os.listdir(debug_path):
+                os.remove(os.path.join(debug_path, file_name))
+
+def extract_infos_from_pdf(source, progress=None, digest=None, correction=CORRECTION_MODE):
+    return assemble_result(iter_infos_from_pdf(source, progress, digest, correction))
 
 if __name__ == "__main__":
     algorithm = "/home/gyupil/Downloads/Introduction to Algorithms (Thomas H. Cormen, Charles E. Leiserson etc.) (Z-Library).pdf"
@@ -0,0 +1,162 @@
+import asyncio, math, threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from service.settings import INFERENCE_WORKERS, SHARD_MIN_PAGES
+from service.api.records import checkpoint_key
+from service.core.checkpoint import CheckpointStore
+from service.core.graph import match_reference_pairs
+from service.core.raster import count_pages
+
+_events = None
+
+def _init_worker(events):
+    global _events
+    _events = events
+
+    import service.api.services
+
+def _warm_up():
+    return True
+
+def _process_document(job_id, pdf_path, digest, correction):
+    from service.api.services import iter_infos_from_pdf
+
+    try:
+        for kind, record in iter_infos_from_pdf(pdf_path, None, digest, correction):
+            _events.put((job_id, kind, record))
+    finally:
+        _events.put((job_id, "end", None))
+
+def _process_shard(job_id, pdf_path, digest, correction, start, stop):
+    from service.api.services import iter_pages_from_pdf
+
+    layout_pages = []
+    try:
+        for page, record in iter_pages_from_pdf(pdf_path, digest, correction, (start, stop)):
+            layout_pages.append(page)
+            _events.put((job_id, "page", record))
+    finally:
+        _events.put((job_id, "end", None))
+
+    return layout_pages
+
+def plan_shards(total_pages, workers, min_pages=SHARD_MIN_PAGES):
+    if workers <= 1 or total_pages <= min_pages:
+        return [(0, total_pages)]
+
+    size = max(min_pages, math.ceil(total_pages / workers))
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+class _JobState:
+    def __init__(self, job, total_pages, tasks):
+        self.job = job
+        self.total_pages = total_pages
+        self.pages_done = 0
+        self.next_page = 0
+        self.pending = {}
+        self.tasks = tasks
+        self.drained = asyncio.Event()
+
+    def push_page(self, record):
+        self.pages_done += 1
+        self.job.progress(self.pages_done, self.total_pages)
+
+        self.pending[record['page_num']] = record
+        while self.next_page in self.pending:
+            self.job.push("page", self.pending.pop(self.next_page))
+            self.next_page += 1
+
+    def end_task(self):
+        self.tasks -= 1
+        if self.tasks == 0:
+            self.drained.set()
+
+class InferencePool:
+    def __init__(self, workers=INFERENCE_WORKERS):
+        self.workers = max(1, workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._executor = None
+        self._events = None
+        self._reader = None
+        self._loop = None
+        self._jobs = {}
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._events = self._context.Queue()
+        self._reader = threading.Thread(target=self._read_events, daemon=True)
+        self._reader.start()
+        self._executor = self._make_executor()
+        self._executor.submit(_warm_up)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._events is not None:
+            self._events.put(None)
+            self._reader.join(timeout=5)
+            self._events = None
+
+    def _make_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context,
+                                   initializer=_init_worker, initargs=(self._events,))
+
+    def _submit(self, fn, *args):
+        try:
+            return self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            print(">>> [Error] Inference workers died. Restarting the pool...", flush=True)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._make_executor()
+            return self._executor.submit(fn, *args)
+
+    def _read_events(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            self._loop.call_soon_threadsafe(self._dispatch, *event)
+
+    def _dispatch(self, job_id, kind, payload):
+        state = self._jobs.get(job_id)
+        if state is None:
+            return
+
+        if kind == "page":
+            state.push_page(payload)
+        elif kind == "end":
+            state.end_task()
+        else:
+            state.job.push(kind, payload)
+
+    async def run(self, job, pdf_path, digest):
+        total_pages = await asyncio.to_thread(count_pages, pdf_path)
+        shards = plan_shards(total_pages, self.workers)
+        state = _JobState(job, total_pages, len(shards))
+        self._jobs[job.id] = state
+        try:
+            if len(shards) == 1:
+                future = self._submit(_process_document, job.id, pdf_path, digest, job.correction)
+                await asyncio.wrap_future(future)
+                await state.drained.wait()
+                return
+
+            print(f">>> [INFO] Splitting {total_pages} pages into {len(shards)} shards", flush=True)
+            futures = [self._submit(_process_shard, job.id, pdf_path, digest, job.correction, start, stop)
+                       for start, stop in shards]
+            try:
+                shard_pages = await asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            await state.drained.wait()
+
+            layout_pages = [page for pages in shard_pages for page in pages]
+            pair_result = await asyncio.to_thread(match_reference_pairs, layout_pages)
+            job.push("matches", pair_result)
+            await asyncio.to_thread(CheckpointStore(checkpoint_key(digest, job.correction)).clear)
+        finally:
+            self._jobs.pop(job.id, None)
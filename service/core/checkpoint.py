@@ -0,0 +1,47 @@
+import hashlib, json, shutil, time
+from service.settings import CHECKPOINT_DIR, CHECKPOINT_TTL
+from service.core.files import file_digest, atomic_write_bytes
+
+def bytes_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def source_digest(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes_digest(source)
+    return file_digest(source)
+
+class CheckpointStore:
+    def __init__(self, key, root=CHECKPOINT_DIR):
+        self.root = root
+        self.path = root/key
+
+    def _file(self, stage, page_index):
+        return self.path/f"{stage}_{page_index}.json"
+
+    def load(self, stage, page_index):
+        try:
+            with open(self._file(stage, page_index), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f">>> [Error] Checkpoint {stage} of page {page_index} is unreadable.({e})")
+            return None
+
+    def save(self, stage, page_index, data):
+        encoded = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        try:
+            atomic_write_bytes(self._file(stage, page_index), encoded)
+        except OSError as e:
+            print(f">>> [Error] Failed to save checkpoint {stage} of page {page_index}.({e})")
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def prune(self, max_age=CHECKPOINT_TTL):
+        if not self.root.exists():
+            return
+        deadline = time.time() - max_age
+        for path in self.root.iterdir():
+            if path != self.path and path.is_dir() and path.stat().st_mtime < deadline:
+                shutil.rmtree(path, ignore_errors=True)
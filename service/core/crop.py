@@ -2,20 +2,72 @@ import cv2
 import matplotlib.pyplot as plt
 import math
 import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from service.settings import PAGE_CACHE_BYTES
 
-def crop_image_by_bbox(image_path: str, bbox: list):
+class PageStore:
+    def __init__(self, loader, max_bytes=PAGE_CACHE_BYTES):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def page_count(self):
+        return len(self.loader)
+
+    def get(self, page_index):
+        with self._lock:
+            img = self._pages.get(page_index)
+            if img is not None:
+                self._pages.move_to_end(page_index)
+                return img
+
+        img = self.loader(page_index)
+        if img is not None:
+            self.put(page_index, img)
+        return img
+
+    def put(self, page_index, img):
+        with self._lock:
+            old = self._pages.pop(page_index, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._pages[page_index] = img
+            self.nbytes += img.nbytes
+
+            while self.nbytes > self.max_bytes and len(self._pages) > 1:
+                _, evicted = self._pages.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.nbytes = 0
+
+def read_image(image_path):
+    img = cv2.imread(str(image_path))
+    if img is None:
+        print(f">>> [Error] {os.path.basename(image_path)} not found.")
+        return None
+
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def crop_image_by_bbox(image, bbox: list):
     l_padding = 40
     r_padding = 59
     u_padding = 17
     d_padding = 16
 
-    img = cv2.imread(str(image_path))
-    if img is None:
-        print(f">>> [Error] {os.path.basename(image_path)} not found.")
+    if isinstance(image, (str, Path)):
+        image = read_image(image)
+    if image is None:
         return None
 
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    height, width, _ = img_rgb.shape
+    height, width = image.shape[:2]
     bbox = [
         bbox[0] * width,
         bbox[1] * height,
@@ -24,17 +76,16 @@ def crop_image_by_bbox(image_path: str, bbox: list):
     ]
     xmin, ymin, xmax, ymax = [math.ceil(box) for box in bbox]
 
-    img_cropped = img_rgb[ymin-u_padding:ymax+d_padding, xmin-l_padding:xmax+r_padding]
+    img_cropped = image[ymin-u_padding:ymax+d_padding, xmin-l_padding:xmax+r_padding]
 
     return img_cropped
 
-def show(coordinate: list, path: str) -> None:
-    image_file = path
+def show(coordinate: list, image) -> None:
     bounding_box = coordinate
 
-    cropped_image_array = crop_image_by_bbox(image_file, bounding_box)
+    cropped_image_array = crop_image_by_bbox(image, bounding_box)
 
     if cropped_image_array is not None:
         plt.imshow(cropped_image_array)
         plt.axis('on')
-        plt.show()
\ No newline at end of file
+        plt.show()
@@ -0,0 +1,21 @@
+import hashlib, os, uuid
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def atomic_write_bytes(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if temp_path.exists():
+            os.remove(temp_path)
+        raise
@@ -1,7 +1,19 @@
-import networkx as nx
-import re, math, json
+import re, json
+import numpy as np
 from collections import defaultdict
-import matplotlib.pyplot as plt
+from service.core.sections import assign_sections
+
+class DocNode:
+    __slots__ = ('id', 'type', 'page', 'bbox', 'text', 'ref_info', 'section_info')
+
+    def __init__(self, id, type, page, bbox, text=None, ref_info=None, section_info=None):
+        self.id = id
+        self.type = type
+        self.page = page
+        self.bbox = bbox
+        self.text = text
+        self.ref_info = ref_info
+        self.section_info = section_info
 
 def load_and_transform_data(data):
     transformed_results = []
@@ -14,26 +26,15 @@ def load_and_transform_data(data):
             continue
 
         for i, box in enumerate(boxes):
-            node = {
-                'id': f"pg{page_index}_box{i}",
-                'type': box['label'],
-                'page': page_index,
-                'bbox': [
-                    box['coordinate'][0],
-                    box['coordinate'][1],
-                    box['coordinate'][2],
-                    box['coordinate'][3]
-                ]
-            }
-
-            if 'text' in box:
-                node['text'] = box['text']
-            if 'ref_info' in box:
-                node['ref_info'] = box['ref_info']
-            if 'section_info' in box:
-                node['section_info'] = box['section_info']
-
-            transformed_results.append(node)
+            transformed_results.append(DocNode(
+                f"pg{page_index}_box{i}",
+                box['label'],
+                page_index,
+                box['coordinate'][:4],
+                box.get('text'),
+                box.get('ref_info'),
+                box.get('section_info')
+            ))
 
     return transformed_results
 
@@ -45,168 +46,160 @@ VALID_NODE_TYPES = [
     "formula_number", "page_number", "number", "footnote", "chart_title"
 ]
 IGNORED_NODE_TYPES = ["header", "footer", "header_image", "footer_image", "seal"]
+NO_SECTION = -1
 
-def _get_node_center(node):
-    bbox = node['bbox']
-    center_x = (bbox[0] + bbox[2]) / 2
-    center_y = (bbox[1] + bbox[3]) / 2
-    return center_x, center_y
-
-def _get_distance(node1, node2):
-    x1, y1 = _get_node_center(node1)
-    x2, y2 = _get_node_center(node2)
-    return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)+abs(node1['page']-node2['page'])
-
-def _add_sequence_edges(graph, page_nodes):
-    # sorted_nodes = sorted(page_nodes, key=lambda n: n['bbox'][1])
-
-    # left_boxes = []
-    # right_boxes = []
-    # for node in sorted_nodes:
-    #     if node['bbox'][0] < 0.4:
-    #         left_boxes.append(node)
-    #     else:
-    #         right_boxes.append(node)
-    # if len(right_boxes) > len(sorted_nodes)*0.3:
-    #     sorted_nodes = left_boxes + right_boxes
-
-    for i in range(len(page_nodes)-1):
-        node1 = page_nodes[i]
-        node2 = page_nodes[i+1]
-        graph.add_edge(node1['id'], node2['id'], type='sequence')
-
-def _add_hierarchical_edges(graph, all_nodes):
-    section_node_ids = list(range(1, 30))
-
-    for sec_id in section_node_ids:
-        graph.add_node(f"Section_{sec_id}", node_type="section")
-
-    for node_id, attrs in graph.nodes(data=True):
-        if 'section_info' in attrs:
-            target_section_node = f"Section_{int(float(attrs['section_info']))}"
-            if graph.has_node(target_section_node):
-                graph.add_edge(node_id, target_section_node, type='hierarchical')
+def _section_number(section_info):
+    try:
+        return int(float(section_info))
+    except (TypeError, ValueError):
+        return None
 
-def build_document_graph(processed_data):
-    G = nx.DiGraph()
-    all_nodes = []
-    for node_data in processed_data:
-        if node_data['type'] in IGNORED_NODE_TYPES:
-            continue
+class DocumentGraph:
+    __slots__ = ('nodes', 'pages', 'centers', 'section_ids')
 
-        node_attrs = node_data.copy()
-        G.add_node(node_attrs['id'], node_type='doc_component', **node_attrs)
-        all_nodes.append(node_attrs)
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.pages = np.array([node.page for node in nodes], dtype=np.int32)
+        bboxes = np.array([node.bbox for node in nodes], dtype=np.float64).reshape(-1, 4)
+        self.centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
 
-    nodes_by_page = defaultdict(list)
-    for node in all_nodes:
-        nodes_by_page[node['page']].append(node)
+        section_ids = [_section_number(node.section_info) for node in nodes]
+        self.section_ids = np.array([NO_SECTION if sec is None else sec for sec in section_ids], dtype=np.int64)
 
-    for page_num, page_nodes in nodes_by_page.items():
-        _add_sequence_edges(G, page_nodes)
+    def __len__(self):
+        return len(self.nodes)
 
-    _add_hierarchical_edges(G, all_nodes)
+    def distances(self, indices, source_index):
+        delta = self.centers[indices] - self.centers[source_index]
+        return np.hypot(delta[:, 0], delta[:, 1]) + np.abs(self.pages[indices] - self.pages[source_index])
 
-    return G
+    def sequence_edges(self):
+        for i in range(len(self.nodes) - 1):
+            if self.pages[i] == self.pages[i + 1]:
+                yield i, i + 1
 
-def find_target_with_name(scope_candidates, ref_item, source):
-    candidate = []
-    label_pattern = r'\b(Figure|Fig|Table|Formula|Algorithm|Chart|Equation|Eq)\s*\.?\s*\(?(\d+(\.\d+)?|[A-Za-z]+)\)?'
-    label_pattern_1 = r'\b(\d+(\.\d+)?)\s*\.?\s*(Figure|Fig|Table|Formula|Algorithm|Chart|Equation|Eq)'
-    equation_pattern = r'\b(Equation|Eq)\s*\.?\s*\(?\s*(\d+(\.\d+))\s*\)?'
+    def hierarchical_edges(self):
+        for i in np.flatnonzero(self.section_ids != NO_SECTION):
+            yield int(i), int(self.section_ids[i])
 
-    target_text = ref_item.get('figure_text', '')
-    match = re.search(label_pattern, target_text, re.IGNORECASE)
+    def to_networkx(self):
+        import networkx as nx
+
+        G = nx.DiGraph()
+        for node in self.nodes:
+            G.add_node(node.id, node_type='doc_component', type=node.type, page=node.page, bbox=node.bbox)
+        for i, j in self.sequence_edges():
+            G.add_edge(self.nodes[i].id, self.nodes[j].id, type='sequence')
+        for i, section in self.hierarchical_edges():
+            G.add_node(f"Section_{section}", node_type="section")
+            G.add_edge(self.nodes[i].id, f"Section_{section}", type='hierarchical')
+        return G
+
+def build_document_graph(processed_data):
+    return DocumentGraph([node for node in processed_data if node.type not in IGNORED_NODE_TYPES])
+
+LABEL_PATTERN = re.compile(r'\b(Figure|Fig|Table|Formula|Algorithm|Chart|Equation|Eq)\s*\.?\s*\(?(\d+(\.\d+)?|[A-Za-z]+)\)?', re.IGNORECASE)
+LABEL_PATTERN_1 = re.compile(r'\b(\d+(\.\d+)?)\s*\.?\s*(Figure|Fig|Table|Formula|Algorithm|Chart|Equation|Eq)', re.IGNORECASE)
+EQUATION_PATTERN = re.compile(r'\b(Equation|Eq)\s*\.?\s*\(?\s*(\d+(\.\d+))\s*\)?', re.IGNORECASE)
+EQUATION_NUMBER_PATTERN = re.compile(r'\(\s*(\d+)\s*\)')
+KIND_ALIASES = {'fig': 'figure', 'eq': 'equation'}
+TARGET_NODE_TYPES = ['image', 'table', 'figure', 'chart', 'algorithm', 'display_formula']
 
+def _normalize_kind(kind):
+    kind = kind.lower()
+    return KIND_ALIASES.get(kind, kind)
+
+def _reference_key(ref_item):
+    target_text = ref_item.get('figure_text', '')
+    match = LABEL_PATTERN.search(target_text) or EQUATION_PATTERN.search(target_text)
     if not match:
-        match = re.search(equation_pattern, target_text, re.IGNORECASE)
+        return None
+    return _normalize_kind(match.group(1)), match.group(2)
 
+def _target_key(text):
+    match = LABEL_PATTERN_1.search(text)
+    if match:
+        return _normalize_kind(match.group(3)), match.group(1)
+    match = LABEL_PATTERN.search(text)
+    if match:
+        return _normalize_kind(match.group(1)), match.group(2)
+    match = EQUATION_NUMBER_PATTERN.search(text)
     if match:
-        t_kind = match.group(1).lower()
-        if t_kind == 'fig': t_kind = 'figure'
-        if t_kind == 'eq': t_kind = 'equation'
-        t_num = match.group(2)
-
-        for target in scope_candidates:
-            tm = re.search(label_pattern_1, target.get('text', ''), re.IGNORECASE)
-            if not tm:
-                tm = re.search(label_pattern, target.get('text', ''), re.IGNORECASE)
-                if not tm:
-                    tm = re.search(r'\(\s*(\d+)\s*\)', target.get('text', ''))
-                    if tm:
-                        tn = tm.group(1)
-                        tk = "equation"
-                else:
-                    tk = tm.group(1).lower()
-                    if tk == 'fig': tk = 'figure'
-                    tn = tm.group(2)
-            else:
-                tk = tm.group(3).lower()
-                if tk == 'fig': tk = 'figure'
-                tn = tm.group(1)
-            if tm:
-                if t_kind == tk and t_num == tn:
-                    candidate.append(target)
-                    break
-
-    if candidate:
-        candidate.sort(key=lambda node: _get_distance(node, source))
-        return candidate[0]
-    else:
+        return 'equation', match.group(1)
+    return None
+
+def build_target_index(graph, indices):
+    index = defaultdict(list)
+    for i in indices:
+        text = graph.nodes[i].text
+        key = _target_key(text) if text else None
+        if key is not None:
+            index[key].append(i)
+    return {key: np.array(members, dtype=np.intp) for key, members in index.items()}
+
+def find_target_with_name(graph, candidates, source_index):
+    if candidates is None or len(candidates) == 0:
         return None
+    return graph.nodes[candidates[np.argmin(graph.distances(candidates, source_index))]]
 
 def create_reference_pairs(graph):
-    target_nodes_list = []
-    source_nodes_list = []
-    for node_id, attrs in graph.nodes(data=True):
-        if attrs.get('type') in ['image', 'table', 'figure', 'chart', 'algorithm', 'display_formula']:
-            node_data = attrs.copy()
-            node_data['id'] = node_id
-            target_nodes_list.append(node_data)
-        if attrs.get('type') == 'text':
-            node_data = attrs.copy()
-            node_data['id'] = node_id
-            source_nodes_list.append(node_data)
+    target_indices = [i for i, node in enumerate(graph.nodes) if node.type in TARGET_NODE_TYPES]
+    target_index = build_target_index(graph, target_indices)
 
     pairs = []
 
-    for source_attrs in source_nodes_list:
-        source_id = source_attrs.get('id')
-        if 'ref_info' not in source_attrs:
+    for source_index, source in enumerate(graph.nodes):
+        if source.type != 'text' or source.ref_info is None:
             continue
 
-        for ref_item in source_attrs['ref_info']:
-            scope = []
-            if ref_item['section_info']:
-                try:
-                    section_node_id = f"Section_{int(float(ref_item.get('section_info')[0]))}"
-                    if not graph.has_node(section_node_id):
-                        scope = []
-                    for u, v, data in graph.in_edges(section_node_id, data=True):
-                        if data.get('type') == 'hierarchical':
-                            node_data = graph.nodes[u]
-                            scope.append(node_data)
-                except Exception:
-                    scope = target_nodes_list
-
-            best_match = find_target_with_name(scope, ref_item, source_attrs)
-
-            if not best_match:
-                best_match = find_target_with_name(target_nodes_list, ref_item, source_attrs)
-
-            if best_match:
-                pairs.append({
-                    'source_id': source_id,
-                    'page': source_attrs['page'],
-                    'raw_text': ref_item['raw_text'],
-                    'figure_text': ref_item['figure_text'],
-                    'text_box': ref_item['text_box'],
-                    'ref': best_match
-                })
+        for ref_item in source.ref_info:
+            key = _reference_key(ref_item)
+            candidates = target_index.get(key)
+            if candidates is None:
+                continue
+
+            best_match = None
+            section = _section_number(ref_item['section_info'][0]) if ref_item['section_info'] else None
+            if section is not None:
+                scoped = candidates[graph.section_ids[candidates] == section]
+                best_match = find_target_with_name(graph, scoped, source_index)
+
+            if best_match is None:
+                best_match = find_target_with_name(graph, candidates, source_index)
+
+            pairs.append({
+                'source_id': source.id,
+                'page': source.page,
+                'raw_text': ref_item['raw_text'],
+                'figure_text': ref_item['figure_text'],
+                'text_box': ref_item['text_box'],
+                'ref': best_match
+            })
 
     return pairs
 
-def save_graph_to_img(graph: nx.Graph):
+def match_reference_pairs(layout_pages):
+    assign_sections(layout_pages)
+    graph = build_document_graph(load_and_transform_data({'pages': layout_pages}))
+
+    pair_result = []
+    for pair in create_reference_pairs(graph):
+        pair_result.append({
+            'figure_box': pair['ref'].bbox,
+            'figure_page': pair['ref'].page,
+            'page_num': pair['page'],
+            'raw_text': pair['raw_text'],
+            'figure_text': pair['figure_text'],
+            'text_box': pair['text_box']
+        })
+
+    return pair_result
+
+def save_graph_to_img(document_graph):
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
+    graph = document_graph.to_networkx()
     plt.figure(figsize=(30, 30))
     for u, v, d in graph.edges(data=True):
         if d.get('type') == 'sequence':
@@ -1,226 +1,103 @@
 from paddleocr import LayoutDetection
 from service.core.pre import *
 from pathlib import Path
-import json, os, fitz
+import os, cv2
 from config import debug
 from PIL import Image, ImageDraw
 import re
 
 model = LayoutDetection(model_name="PP-DocLayoutV2")
 
-class HeaderParser:
-    def __init__(self):
-        self.patterns = {
-            'part': re.compile(r'^(Part|PART)\s*([IVX0-9]+|[A-Z])\s*(.*)', re.IGNORECASE),
-            'chapter': re.compile(r'^(Chapter|CHAPTER)\s*([0-9]+)\s*(.*)', re.IGNORECASE),
-            'section_explicit': re.compile(r'^(Section|§)\s*([0-9]+)\s*(.*)', re.IGNORECASE),
-            'section_numeric': re.compile(r'^([0-9]+\.[0-9]+)\s+(.*)'),
-            'special': re.compile(r'^(Preface|Contents|Index|Bibliography|Appendix|Problems|Notes|Exercises)',
-                                  re.IGNORECASE)
-        }
-
-        self.state = {
-            'part': None,
-            'chapter': None,
-            'section_num': None,
-            'section_title': None
-        }
-
-    def _get_priority(self, text):
-        if self.patterns['part'].match(text): return 1
-        if self.patterns['chapter'].match(text): return 2
-        return 3
-
-    def feed_page(self, header_list):
-        if not header_list:
-            return self._format_output()
-
-        sorted_headers = sorted(header_list, key=lambda x: self._get_priority(x))
-
-        for text in sorted_headers:
-            clean_text = text.strip()
-
-            if self.patterns['part'].match(clean_text):
-                self.state['part'] = clean_text
-                continue
-
-            if self.patterns['chapter'].match(clean_text):
-                self.state['chapter'] = clean_text
-                self.state['section_num'] = None
-                self.state['section_title'] = None
-                continue
-
-            sec_num, sec_title = None, None
-
-            m_sec_exp = self.patterns['section_explicit'].match(clean_text)
-            m_sec_num = self.patterns['section_numeric'].match(clean_text)
-
-            if m_sec_exp:
-                sec_num = m_sec_exp.group(2)
-                sec_title = m_sec_exp.group(3).strip()
-            elif m_sec_num:
-                sec_num = m_sec_num.group(1)
-                sec_title = m_sec_num.group(2).strip()
-
-            if sec_num:
-                if (self.state['section_num'] != sec_num) or \
-                        (sec_title and (
-                                not self.state['section_title'] or len(sec_title) > len(self.state['section_title']))):
-                    self.state['section_num'] = sec_num
-                    self.state['section_title'] = sec_title
-                continue
-
-            if self.patterns['special'].match(clean_text):
-                self.state['section_title'] = clean_text
-
-        return self._format_output()
+def _normalize_coordinate(coord, width_px, height_px):
+    return [
+        coord[0]/width_px,
+        coord[1]/height_px,
+        coord[2]/width_px,
+        coord[3]/height_px
+    ]
 
-    def _format_output(self):
-        full_title = self.state['section_num'] if self.state['section_num'] else ""
+def _ocr_section_headers(page_data, page_image):
+    header_boxes = [box for box in page_data["boxes"]
+                    if box['label'] in ['header', 'paragraph_title'] and box['coordinate'][1] < 0.17]
+    sections = ocr_batch([crop_image_by_bbox(page_image, box['coordinate']) for box in header_boxes])
 
-        return full_title
+    section_nos = []
+    for section in sections:
+        try:
+            section_nos.append(section['rec_texts'][0])
+        except Exception:
+            pass
 
-parser = HeaderParser()
+    return section_nos
 
-def layout_detection(path):
-    doc = fitz.open(path)
+def iter_layout_detection(pages, checkpoints=None, page_range=None):
+    start, stop = page_range if page_range is not None else (0, pages.page_count)
+    for page_index in range(start, stop):
+        saved = checkpoints.load("layout", page_index) if checkpoints is not None else None
+        if saved is not None:
+            page_layout = saved['page']
+            page_layout['headers'] = saved['headers']
+            yield page_layout
+            continue
 
-    output = model.predict(input=path,
-                           layout_nms=True)
+        page_image = pages.get(page_index)
+        height_px, width_px = page_image.shape[:2]
 
-    if debug:
-        for res in output:
-            res.save_to_img(Path(__file__).parent.parent.parent/'data'/'debug')
+        output = model.predict(input=cv2.cvtColor(page_image, cv2.COLOR_GRAY2BGR),
+                               layout_nms=True)
+        res = output[0]
 
-    structured_document = {
-        "document_path": None,
-        "total_pages": 0,
-        "pages": []
-    }
+        if debug:
+            res.save_to_img(Path(__file__).parent.parent.parent/'data'/'debug'/f"page_{page_index+1}.png")
 
-    for i, res in enumerate(output):
         data = res.json['res']
-        page = doc.load_page(data['page_index'])
-        width_pnt = page.rect.width
-        height_pnt = page.rect.height
-        width_px = width_pnt / 72 * 144
-        height_px = height_pnt / 72 * 144
-        if structured_document["document_path"] is None:
-            structured_document["document_path"] = data.get("input_path", "Unknown")
-
+        data['page_index'] = page_index
         for box in data["boxes"]:
-            coord = box['coordinate']
-            coord = [
-                coord[0]/width_px,
-                coord[1]/height_px,
-                coord[2]/width_px,
-                coord[3]/height_px
-            ]
-            box["coordinate"] = coord
+            box["coordinate"] = _normalize_coordinate(box['coordinate'], width_px, height_px)
+        headers = _ocr_section_headers(data, page_image)
+
         processed_data_1 = remove_nested_boxes(data)
-        folder_name = os.path.basename(path).split(".")[0]
-        final_page_data = group_image_with_caption(processed_data_1, folder_name)
-
-        section_nos = []
-        if i > 0:
-            previous_page_data = output[i-1].json['res']
-            for j, box in enumerate(previous_page_data["boxes"]):
-                if box['label'] in ['header', 'paragraph_title'] and box['coordinate'][1]/height_px < 0.17:
-                    section_coord = [
-                        box['coordinate'][0] / width_px,
-                        box['coordinate'][1] / height_px,
-                        box['coordinate'][2] / width_px,
-                        box['coordinate'][3] / height_px
-                    ]
-                    filename = "page_" + str(previous_page_data['page_index']+1) + ".png"
-                    try:
-                        section = ocr(crop_image_by_bbox(str(Path(__file__).parent.parent.parent/"data"/"temp"/folder_name/filename), section_coord))
-                        section_no = ""
-                        for sec_res in section:
-                            section_no = section_no + sec_res['rec_texts'][0]
-                        section_nos.append(section_no)
-                    except Exception:
-                        pass
+        final_page_data = group_image_with_caption(processed_data_1, pages)
 
-        data = res.json['res']
-        for j, box in enumerate(data["boxes"]):
-            if box['label'] in ['header', 'paragraph_title'] and box['coordinate'][1]/height_px < 0.17:
-                section_coord = [
-                    box['coordinate'][0] / width_px,
-                    box['coordinate'][1] / height_px,
-                    box['coordinate'][2] / width_px,
-                    box['coordinate'][3] / height_px
-                ]
-                filename = "page_" + str(data['page_index']+1) + ".png"
-                try:
-                    section_no = ""
-                    section = ocr(crop_image_by_bbox(str(Path(__file__).parent.parent.parent/"data"/"temp"/folder_name/filename), section_coord))
-                    for sec_res in section:
-                        section_no = section_no + sec_res['rec_texts'][0]
-                    section_nos.append(section_no)
-                except Exception:
-                    pass
-
-        page_section = parser.feed_page(section_nos)
-        if page_section != "":
-            for box in final_page_data["boxes"]:
-                box['section_info'] = page_section
-
-        structured_document['pages'].append({
+        page_layout = {
             "page_index": final_page_data["page_index"],
             "boxes": final_page_data["boxes"]
-        })
-
-    doc.close()
-    structured_document['pages'].sort(key=lambda p: p["page_index"])
+        }
 
-    structured_document["total_pages"] = len(structured_document['pages'])
-    filename = os.path.basename(path).split(".")[0] + ".json"
+        if checkpoints is not None:
+            checkpoints.save("layout", page_index, {'page': page_layout, 'headers': headers})
 
-    try:
-        with open(Path(__file__).parent.parent.parent/'data'/'temp'/filename, 'w', encoding='utf-8') as f:
-            json.dump(structured_document, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f">>> [Error] Failed to save structured json.({e})")
+        page_layout['headers'] = headers
+        yield page_layout
 
-import img2pdf
-def det_debug(output: dict, folder_name: str, do: bool = debug):
+import img2pdf, io
+def det_debug(output: dict, pages: PageStore, folder_name: str, do: bool = debug):
     if not do:
         return
-    def draw_bounding_box(image_path: str, rel_coord: list):
-        try:
-            with Image.open(image_path).convert("RGB") as img:
-                width, height = img.size
-                draw = ImageDraw.Draw(img)
-                bbox_coords = [(math.ceil(rel_coord[0] * width), math.ceil(rel_coord[1] * height)),
-                               (math.ceil(rel_coord[2] * width), math.ceil(rel_coord[3] * height))]
-                draw.rectangle(bbox_coords, outline="red", width=4)
-                img.save(image_path)
-        except FileNotFoundError:
-            print(f">>> Error: Image not found at {image_path}")
-        except Exception as e:
-            print(f">>> An error occurred: {e}")
-
-    images_path = str(Path(__file__).parent.parent.parent/'data'/'temp'/folder_name)
-    imgs = [
-        os.path.join(images_path, f)
-        for f in os.listdir(images_path)
-        if f.lower().endswith(".png")
-    ]
-
+    def draw_bounding_box(img, rel_coord: list):
+        width, height = img.size
+        draw = ImageDraw.Draw(img)
+        bbox_coords = [(math.ceil(rel_coord[0] * width), math.ceil(rel_coord[1] * height)),
+                       (math.ceil(rel_coord[2] * width), math.ceil(rel_coord[3] * height))]
+        draw.rectangle(bbox_coords, outline="red", width=4)
+
+    boxes_by_page = {}
     for pair in output['matches']:
-        filename = "page_" + str(pair['page_num'] + 1) + ".png"
-        path = str(Path(__file__).parent.parent.parent/'data'/'temp'/folder_name/filename)
-        coord = pair['text_box']
-        draw_bounding_box(path, coord)
-        filename = "page_" + str(pair['figure_page'] + 1) + ".png"
-        path = str(Path(__file__).parent.parent.parent/'data'/'temp'/folder_name/filename)
-        coord = pair['figure_box']
-        draw_bounding_box(path, coord)
-
-    imgs.sort(key=lambda p: int(((p.split('/')[-1]).split(".")[0]).split("_")[-1]))
-
-    with open(Path(__file__).parent.parent.parent/'data'/'temp'/folder_name/'output.pdf', "wb") as f:
+        boxes_by_page.setdefault(pair['page_num'], []).append(pair['text_box'])
+        boxes_by_page.setdefault(pair['figure_page'], []).append(pair['figure_box'])
+
+    imgs = []
+    for page_index in range(pages.page_count):
+        img = Image.fromarray(pages.get(page_index)).convert("RGB")
+        for coord in boxes_by_page.get(page_index, []):
+            draw_bounding_box(img, coord)
+        buffer = io.BytesIO()
+        img.save(buffer, "PNG")
+        imgs.append(buffer.getvalue())
+
+    output_folder = Path(__file__).parent.parent.parent/'data'/'temp'/folder_name
+    output_folder.mkdir(parents=True, exist_ok=True)
+    with open(output_folder/'output.pdf', "wb") as f:
         f.write(img2pdf.convert(imgs))
 
     debug_images_path = str(Path(__file__).parent.parent.parent/'data'/'debug')
@@ -229,7 +106,7 @@ def det_debug(output: dict, folder_name: str, do: bool = debug):
         for f in os.listdir(debug_images_path)
         if f.lower().endswith(".png")
     ]
-    debug_imgs.sort(key=lambda p: int(p.split("_")[1].split("_")[0]))
+    debug_imgs.sort(key=lambda p: int(re.search(r'page_(\d+)', os.path.basename(p)).group(1)))
 
     with open(Path(__file__).parent.parent.parent/'data'/'debug'/'debug.pdf', "wb") as f:
-        f.write(img2pdf.convert(debug_imgs))
\ No newline at end of file
+        f.write(img2pdf.convert(debug_imgs))
@@ -1,23 +1,39 @@
 from paddleocr import PaddleOCR
+from service.settings import OCR_BATCH_SIZE
 import cv2
 
 ocr_m = PaddleOCR(use_doc_unwarping=False,
                   use_doc_orientation_classify=False,
                   use_textline_orientation=True,
                   text_detection_model_name="PP-OCRv5_server_det",
-                  text_recognition_model_name="PP-OCRv5_server_rec")
+                  text_recognition_model_name="PP-OCRv5_server_rec",
+                  text_recognition_batch_size=OCR_BATCH_SIZE)
 
-def ocr(img):
-    try:
+def _preprocess(img):
+    if img.ndim == 3:
         img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    except Exception:
-        raise
 
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
     img = clahe.apply(img)
     img = cv2.copyMakeBorder(img, 40, 40, 20, 20, cv2.BORDER_CONSTANT, value=255)
     img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
 
-    output = ocr_m.predict(input=img)
+    return img
 
-    return output
\ No newline at end of file
+def ocr_batch(imgs, batch_size=OCR_BATCH_SIZE):
+    results = [None] * len(imgs)
+
+    prepared = []
+    for i, img in enumerate(imgs):
+        try:
+            prepared.append((i, _preprocess(img)))
+        except Exception:
+            print(f">>> [Error] Crop {i} could not be prepared for OCR.")
+
+    for start in range(0, len(prepared), batch_size):
+        batch = prepared[start:start+batch_size]
+        output = ocr_m.predict(input=[img for _, img in batch])
+        for (i, _), res in zip(batch, output):
+            results[i] = res
+
+    return results
@@ -1,13 +1,72 @@
 from symspellpy import SymSpell
 from pathlib import Path
-import re
+from functools import lru_cache
+from service.settings import SEGMENTATION_CACHE_SIZE, SYMSPELL_INDEX_DIR
+from service.core.files import file_digest, atomic_write_bytes
+import re, os, gc
 import numpy as np
 
-sym_spell = SymSpell(max_dictionary_edit_distance=0,
-                     prefix_length=7)
-
 dictionary_path = Path(__file__).parent.parent.parent/"data"/"en-80k.txt"
-sym_spell.load_dictionary(dictionary_path, term_index=0, count_index=1)
+
+def _index_path(dictionary_path, max_edit_distance, prefix_length):
+    digest = file_digest(dictionary_path)[:16]
+    return SYMSPELL_INDEX_DIR/f"{dictionary_path.stem}-{max_edit_distance}-{prefix_length}-{digest}.pickle"
+
+def build_symspell_index(dictionary_path=dictionary_path, max_edit_distance=0, prefix_length=7):
+    sym_spell = SymSpell(max_dictionary_edit_distance=max_edit_distance,
+                         prefix_length=prefix_length)
+    sym_spell.load_dictionary(dictionary_path, term_index=0, count_index=1)
+
+    index_path = _index_path(dictionary_path, max_edit_distance, prefix_length)
+    try:
+        atomic_write_bytes(index_path, sym_spell.save_pickle(to_bytes=True))
+        for stale in index_path.parent.glob(f"{dictionary_path.stem}-{max_edit_distance}-{prefix_length}-*.pickle"):
+            if stale != index_path:
+                os.remove(stale)
+    except OSError as e:
+        print(f">>> [Error] Failed to save SymSpell index.({e})")
+
+    return sym_spell
+
+def load_symspell(dictionary_path=dictionary_path, max_edit_distance=0, prefix_length=7):
+    index_path = _index_path(dictionary_path, max_edit_distance, prefix_length)
+    if index_path.exists():
+        sym_spell = SymSpell(max_dictionary_edit_distance=max_edit_distance,
+                             prefix_length=prefix_length)
+        # unpickling ~300k small containers is several times faster without the cyclic GC
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            loaded = sym_spell.load_pickle(index_path, compressed=False)
+        except Exception as e:
+            print(f">>> [Error] Failed to load SymSpell index.({e})")
+            loaded = False
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if loaded:
+            return sym_spell
+
+    return build_symspell_index(dictionary_path, max_edit_distance, prefix_length)
+
+sym_spell = load_symspell()
+
+def _segment_word(token, sym_spell_instance):
+    term = token.lower()
+    if term in sym_spell_instance.words:
+        return term.capitalize() if token[0].isupper() else term
+
+    return sym_spell_instance.word_segmentation(token).corrected_string
+
+@lru_cache(maxsize=SEGMENTATION_CACHE_SIZE)
+def segment_word(token):
+    return _segment_word(token, sym_spell)
+
+def segmentation_cache_info(since=None):
+    info = segment_word.cache_info()
+    if since is None:
+        return info
+    return info._replace(hits=info.hits - since.hits, misses=info.misses - since.misses)
 
 def correct_segmentation_and_typos(raw_text: str, sym_spell_instance=sym_spell):
     if not raw_text:
@@ -19,7 +78,10 @@ def correct_segmentation_and_typos(raw_text: str, sym_spell_instance=sym_spell):
     correct_tokens = []
     for token in tokens:
         if token.isalpha():
-            correct_token = sym_spell_instance.word_segmentation(token).corrected_string
+            if sym_spell_instance is sym_spell:
+                correct_token = segment_word(token)
+            else:
+                correct_token = _segment_word(token, sym_spell_instance)
         else:
             correct_token = token
         correct_tokens.append(correct_token)
@@ -29,7 +91,7 @@ def correct_segmentation_and_typos(raw_text: str, sym_spell_instance=sym_spell):
 
     return ' '.join(correct_tokens)
 
-def correct(target, line_y_tolerance_ratio=0.3, space_threshold_ratio=0.35):
+def correct(target, line_y_tolerance_ratio=0.3, space_threshold_ratio=0.35, correct_lines=False):
     rec_texts = target["rec_texts"]
     rec_boxes = target["rec_boxes"]
 
@@ -90,7 +152,11 @@ def correct(target, line_y_tolerance_ratio=0.3, space_threshold_ratio=0.35):
 
             previous_box_x_max = current_box_x_max
 
-        final = correct_segmentation_and_typos(str(reconstructed_line_text), sym_spell)
+        if correct_lines:
+            reconstructed_line_text = correct_segmentation_and_typos(str(reconstructed_line_text))
         corrected_lines.append(str(reconstructed_line_text))
 
-    return corrected_lines
\ No newline at end of file
+    return corrected_lines
+
+if __name__ == "__main__":
+    build_symspell_index()
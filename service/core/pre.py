@@ -1,52 +1,63 @@
 from service.core.ocr import *
 from service.core.crop import *
-from pathlib import Path
-
-def _calculate_distance(box1, box2, flag):
-    coord1 = box1['coordinate']
-    coord2 = box2['coordinate']
-    if flag:
-        if coord1[0] > coord2[2]:
-            return abs(coord1[1] - coord2[1]) + abs(coord1[3] - coord2[3])
-        else:
-            return abs(coord2[1] - coord1[1]) + abs(coord2[3] - coord1[3])
-    if coord1[1] > coord2[3]:
-        return 2*(coord1[1] - coord2[3]) + abs(coord1[0] - coord2[0]) + abs(coord1[2] - coord2[2])
-    else:
-        return 2*(coord2[1] - coord1[3]) + abs(coord1[0] - coord2[0]) + abs(coord1[2] - coord2[2])
+import numpy as np
+
+TARGET_LABELS = ['image', 'table', 'figure', 'algorithm', 'chart', 'display_formula']
+TITLE_LABELS = ['figure_title', 'figure_caption', 'table_caption', 'table_title', 'chart_caption', 'chart_title', 'formula_number']
+LABEL_CODES = {label: code for code, label in enumerate(TARGET_LABELS + TITLE_LABELS)}
+TARGET_CODES = [LABEL_CODES[label] for label in TARGET_LABELS]
+TITLE_CODES = [LABEL_CODES[label] for label in TITLE_LABELS]
+FORMULA_NUMBER_CODE = LABEL_CODES['formula_number']
+
+def _box_arrays(boxes):
+    coords = np.array([box['coordinate'] for box in boxes], dtype=np.float64).reshape(-1, 4)
+    codes = np.array([LABEL_CODES.get(box.get('label'), -1) for box in boxes], dtype=np.int16)
+
+    return coords, codes
+
+def _vertical_gap(coords1, coords2):
+    c1 = coords1[:, None, :]
+    c2 = coords2[None, :, :]
+
+    return np.where(c1[..., 1] > c2[..., 3], c1[..., 1] - c2[..., 3], c2[..., 1] - c1[..., 3])
+
+def _distance_matrix(title_coords, target_coords, flags):
+    t = title_coords[:, None, :]
+    g = target_coords[None, :, :]
+
+    side_distance = np.abs(t[..., 1] - g[..., 1]) + np.abs(t[..., 3] - g[..., 3])
+    stacked_distance = 2*_vertical_gap(title_coords, target_coords) + np.abs(t[..., 0] - g[..., 0]) + np.abs(t[..., 2] - g[..., 2])
+
+    return np.where(flags[:, None], side_distance, stacked_distance)
 
 def _group_adjacent_targets(boxes):
     if not boxes:
         return []
 
-    target_labels = ['image', 'table', 'figure', 'algorithm', 'chart', 'display_formula']
+    coords, codes = _box_arrays(boxes)
+    is_target = np.isin(codes, TARGET_CODES)
+    joinable = is_target | ((codes != FORMULA_NUMBER_CODE) & (coords[:, 2] - coords[:, 0] < 0.05))
+
     result_boxes = []
     i = 0
     n = len(boxes)
 
     while i < n:
         current_box = boxes[i]
-        if current_box.get('label') in target_labels:
-            group_to_merge = [current_box]
+        if is_target[i]:
             j = i+1
-            while j < n and (boxes[j].get('label') in target_labels or (boxes[j].get('label') != 'formula_number' and boxes[j].get('coordinate')[2] - boxes[j].get('coordinate')[0] < 0.05)):
-                group_to_merge.append(boxes[j])
+            while j < n and joinable[j]:
                 j+=1
 
-            if len(group_to_merge) == 1:
-                result_boxes.append(group_to_merge[0])
+            if j - i == 1:
+                result_boxes.append(current_box)
             else:
-                first_box = group_to_merge[0]
-                min_x1 = min(box['coordinate'][0] for box in group_to_merge)
-                min_y1 = min(box['coordinate'][1] for box in group_to_merge)
-                max_x2 = max(box['coordinate'][2] for box in group_to_merge)
-                max_y2 = max(box['coordinate'][3] for box in group_to_merge)
-
+                group = coords[i:j]
                 merged_box = {
-                    "cls_id": first_box.get('cls_id'),
-                    "label": first_box.get('label'),
-                    "score": first_box.get('score'),
-                    "coordinate": [min_x1, min_y1, max_x2, max_y2]
+                    "cls_id": current_box.get('cls_id'),
+                    "label": current_box.get('label'),
+                    "score": current_box.get('score'),
+                    "coordinate": [*group[:, :2].min(axis=0).tolist(), *group[:, 2:].max(axis=0).tolist()]
                 }
                 result_boxes.append(merged_box)
             i=j
@@ -110,7 +121,7 @@ def group_and_sort_by_proximity(items):
 
     return sorted_lines
 
-def group_image_with_caption(page_data: dict, folder_name: str):
+def group_image_with_caption(page_data: dict, pages: PageStore):
     boxes = page_data.get('boxes', [])
     if not boxes:
         return page_data
@@ -118,10 +129,11 @@ def group_image_with_caption(page_data: dict, folder_name: str):
     target_boxes = []
     title_boxes = []
     other_boxes = []
-    for i, box in enumerate(boxes):
-        if box.get('label') in ['image', 'table', 'figure', 'algorithm', 'chart', 'display_formula']:
+    _, codes = _box_arrays(boxes)
+    for i, (box, code) in enumerate(zip(boxes, codes)):
+        if code in TARGET_CODES:
             target_boxes.append((i, box))
-        elif box.get('label') in ['figure_title', 'figure_caption', 'table_caption', 'table_title', 'chart_caption', 'chart_title', 'formula_number']:
+        elif code in TITLE_CODES:
             title_boxes.append((i, box))
         else:
             other_boxes.append((i, box))
@@ -129,39 +141,36 @@ def group_image_with_caption(page_data: dict, folder_name: str):
     merged_boxes = []
     used_title_indices = set()
 
-    def sub_y(box1, box2):
-        coord1 = box1['coordinate']
-        coord2 = box2['coordinate']
-        if coord1[1] > coord2[3]:
-            return coord1[1] - coord2[3]
-        else:
-            return coord2[1] - coord1[3]
+    page_image = pages.get(page_data['page_index'])
+    title_outputs = ocr_batch([crop_image_by_bbox(page_image, title_box['coordinate']) for _, title_box in title_boxes])
+
+    if title_boxes and target_boxes:
+        title_coords, title_codes = _box_arrays([box for _, box in title_boxes])
+        target_coords, _ = _box_arrays([box for _, box in target_boxes])
+        distances = _distance_matrix(title_coords, target_coords, title_codes == FORMULA_NUMBER_CODE)
+        distances[_vertical_gap(title_coords, target_coords) >= 0.05] = np.inf
+    available = np.ones(len(target_boxes), dtype=bool)
 
-    for i, title_box in title_boxes:
+    for t, ((i, title_box), title_output) in enumerate(zip(title_boxes, title_outputs)):
         # if title_box['score'] < 0.65:
         #     continue
         title_coord = title_box['coordinate']
-        filename = "page_" + str(page_data['page_index']+1) + ".png"
         if title_box['label'] != 'formula_number':
-            figure_title_output = ocr(crop_image_by_bbox(str(Path(__file__).parent.parent.parent / "data" / "temp" / folder_name / filename), title_coord))
-            figure_title_output = group_and_sort_by_proximity(figure_title_output[0])
+            figure_title_output = group_and_sort_by_proximity(title_output)
         else:
-            figure_title_output = ocr(crop_image_by_bbox(str(Path(__file__).parent.parent.parent / "data" / "temp" / folder_name / filename), title_coord))
+            figure_title_output = [title_output]
 
-        if not figure_title_output[0]:
-            show(title_coord, str(Path(__file__).parent.parent.parent/"data"/"temp"/folder_name/filename))
+        if not figure_title_output or not figure_title_output[0]:
+            show(title_coord, page_image)
             figure_title_output = [""]
 
-        if title_box['label'] == 'formula_number':
-            cal_flag = True
-        else:
-            cal_flag = False
-
-        closest = min(
-            ((i, target, _calculate_distance(title_box, target, cal_flag)) for i, target in target_boxes if i not in used_title_indices and sub_y(title_box, target) < 0.05),
-            key=lambda x: x[2],
-            default=(None, None, float('inf'))
-        )
+        closest = (None, None, float('inf'))
+        if target_boxes:
+            row = np.where(available, distances[t], np.inf)
+            k = int(np.argmin(row))
+            if np.isfinite(row[k]):
+                available[k] = False
+                closest = (target_boxes[k][0], target_boxes[k][1], row[k])
 
         if closest[1]:
             idx, target_box, _ = closest
@@ -227,14 +236,17 @@ def inject_section_info(page_data):
     result_data = page_data
     return result_data
 
-def _is_contained(inner_box, outer_box):
-    inner_coord = inner_box['coordinate']
-    outer_coord = outer_box['coordinate']
+def _containment_matrix(coords):
+    inner = coords[:, None, :]
+    outer = coords[None, :, :]
 
-    is_x_contained = outer_coord[0]-0.0086 <= inner_coord[0] and inner_coord[2] <= outer_coord[2]+0.0086
-    is_y_contained = outer_coord[1]-0.0077 <= inner_coord[1] and inner_coord[3] <= outer_coord[3]+0.0077
+    is_x_contained = (outer[..., 0]-0.0086 <= inner[..., 0]) & (inner[..., 2] <= outer[..., 2]+0.0086)
+    is_y_contained = (outer[..., 1]-0.0077 <= inner[..., 1]) & (inner[..., 3] <= outer[..., 3]+0.0077)
 
-    return is_x_contained and is_y_contained
+    contained = is_x_contained & is_y_contained
+    np.fill_diagonal(contained, False)
+
+    return contained
 
 def remove_nested_boxes(page_data):
     boxes = page_data['boxes']
@@ -256,16 +268,10 @@ def remove_nested_boxes(page_data):
     # else:
     boxes = _group_adjacent_targets(boxes)
 
-    indices_to_remove = set()
-
-    for i in range(len(boxes)):
-        for j in range(len(boxes)):
-            if i == j:
-                continue
-            if _is_contained(boxes[i], boxes[j]):
-                indices_to_remove.add(i)
+    coords, _ = _box_arrays(boxes)
+    is_nested = _containment_matrix(coords).any(axis=1)
 
-    boxes_to_keep = [box for i, box in enumerate(boxes) if i not in indices_to_remove]
+    boxes_to_keep = [box for box, nested in zip(boxes, is_nested) if not nested]
 
     final_boxes = boxes_to_keep
 
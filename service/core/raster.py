@@ -0,0 +1,153 @@
+import fitz
+import numpy as np
+import mmap, multiprocessing, os, tempfile, threading, uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from service.settings import RENDER_WORKERS, RENDER_CHUNK_PAGES, RENDER_MAX_IN_FLIGHT, SPOOL_DIR
+
+RENDER_DPI = 300
+
+def samples_to_array(samples, width, height, stride, n):
+    img = np.frombuffer(samples, dtype=np.uint8).reshape(height, stride)
+    img = img[:, :width * n].reshape(height, width, n)
+    if n == 1:
+        img = img[:, :, 0]
+
+    return img
+
+def is_pdf_bytes(source):
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+def open_pdf(source):
+    if is_pdf_bytes(source):
+        return fitz.open(stream=memoryview(source), filetype="pdf")
+
+    with open(source, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return fitz.open(stream=memoryview(mapped), filetype="pdf")
+
+def spool_pdf(data, root=SPOOL_DIR):
+    for directory in (root, tempfile.gettempdir()):
+        path = os.path.join(directory, f"ocr-{uuid.uuid4().hex}.pdf")
+        try:
+            with open(path, 'wb') as f:
+                f.write(data)
+            return path
+        except OSError as e:
+            print(f">>> [INFO] Could not spool the PDF into {directory}.({e})", flush=True)
+            if os.path.exists(path):
+                os.remove(path)
+
+    raise OSError("No spool directory could hold the PDF.")
+
+def count_pages(source):
+    with open_pdf(source) as doc:
+        return doc.page_count
+
+def render_page(page, dpi=RENDER_DPI):
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+
+def _render_range(pdf_path, start, stop, dpi):
+    rendered = []
+    with open_pdf(pdf_path) as doc:
+        for page_index in range(start, stop):
+            page = doc.load_page(page_index)
+            pix = render_page(page, dpi)
+            rendered.append((page_index, (pix.samples, pix.width, pix.height, pix.stride, pix.n)))
+
+    return rendered
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool(workers=RENDER_WORKERS):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=workers,
+                                               mp_context=multiprocessing.get_context("spawn"))
+
+    return _render_pool
+
+class PdfRasterizer:
+    def __init__(self, source, dpi=RENDER_DPI, workers=RENDER_WORKERS,
+                 chunk_pages=RENDER_CHUNK_PAGES, max_in_flight=RENDER_MAX_IN_FLIGHT, page_range=None):
+        self.pdf_path = None if is_pdf_bytes(source) else os.path.abspath(source)
+        self.doc = open_pdf(source if self.pdf_path is None else self.pdf_path)
+        self.stop = self.doc.page_count if page_range is None else min(page_range[1], self.doc.page_count)
+        self.dpi = dpi
+        self.workers = workers
+        self.chunk_pages = max(1, chunk_pages)
+        self.max_in_flight = max(self.chunk_pages, max_in_flight)
+
+        self._pending = OrderedDict()
+        self._ready = {}
+        self._next_start = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.doc.page_count
+
+    def _use_pool(self):
+        return self.pdf_path is not None and self.workers > 1 and self.doc.page_count > self.chunk_pages
+
+    def _in_flight(self):
+        return sum(stop - start for start, (stop, _) in self._pending.items()) + len(self._ready)
+
+    def _schedule(self, page_index):
+        if page_index >= self._next_start:
+            self._next_start = page_index
+
+        pool = get_render_pool(self.workers)
+        while self._next_start < self.stop and self._in_flight() + self.chunk_pages <= self.max_in_flight:
+            stop = min(self._next_start + self.chunk_pages, self.stop)
+            self._pending[self._next_start] = (stop, pool.submit(_render_range, self.pdf_path,
+                                                                 self._next_start, stop, self.dpi))
+            self._next_start = stop
+
+    def _collect(self, page_index):
+        for start, (stop, future) in self._pending.items():
+            if start <= page_index < stop:
+                break
+        else:
+            return
+
+        del self._pending[start]
+        for index, buffer in future.result():
+            self._ready[index] = samples_to_array(*buffer)
+
+    def _drop_before(self, page_index):
+        for index in [index for index in self._ready if index < page_index]:
+            del self._ready[index]
+        for start in [start for start, (stop, _) in self._pending.items() if stop <= page_index]:
+            _, future = self._pending.pop(start)
+            future.cancel()
+
+    def _render_local(self, page_index):
+        page = self.doc.load_page(page_index)
+        pix = render_page(page, self.dpi)
+        return samples_to_array(pix.samples, pix.width, pix.height, pix.stride, pix.n)
+
+    def __call__(self, page_index):
+        with self._lock:
+            if not self._use_pool():
+                return self._render_local(page_index)
+
+            self._schedule(page_index)
+            if page_index not in self._ready:
+                self._collect(page_index)
+            img = self._ready.pop(page_index, None)
+            self._drop_before(page_index)
+            self._schedule(page_index + 1)
+            if img is None:
+                img = self._render_local(page_index)
+
+        return img
+
+    def close(self):
+        with self._lock:
+            for _, future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._ready.clear()
+            self.doc.close()
@@ -1,24 +1,166 @@
+import math, os, re, threading, time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from service.settings import DOWNLOAD_CHUNK_BYTES, DOWNLOAD_PARTS, DOWNLOAD_PART_BYTES, \
+    DOWNLOAD_RETRIES, DOWNLOAD_BACKOFF_MS, DOWNLOAD_READ_TIMEOUT
 
-def download_file_from_presigned_url(url, save_path):
+CONNECT_TIMEOUT = 10
+RETRY_STATUS = (429, 500, 502, 503, 504)
+CONTENT_RANGE = re.compile(r'bytes\s+\d+-\d+/(\d+)')
+
+class DownloadError(Exception):
+    pass
+
+class _RetryableError(Exception):
+    pass
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(10, DOWNLOAD_PARTS * 2))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+
+    return _session
+
+class _Target:
+    def __init__(self, save_path=None, size=0):
+        self.buffer = None
+        self.fd = None
+        if save_path is None:
+            self.buffer = bytearray(size)
+        else:
+            self.fd = os.open(save_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.ftruncate(self.fd, size)
+
+    def write_at(self, offset, data):
+        if self.fd is None:
+            self.buffer[offset:offset + len(data)] = data
+        else:
+            os.pwrite(self.fd, data, offset)
+
+    def reset(self):
+        if self.fd is None:
+            del self.buffer[:]
+        else:
+            os.ftruncate(self.fd, 0)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def _read_timeout(deadline):
+    if deadline is None:
+        return DOWNLOAD_READ_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DownloadError("Download timed out.")
+
+    return min(remaining, DOWNLOAD_READ_TIMEOUT)
+
+def _get(url, deadline, headers=None):
+    read_timeout = _read_timeout(deadline)
+    response = get_session().get(url, headers=headers, stream=True,
+                                 timeout=(min(CONNECT_TIMEOUT, read_timeout), read_timeout))
+    if response.status_code in RETRY_STATUS:
+        response.close()
+        raise _RetryableError(f"HTTP {response.status_code}")
+    if response.status_code >= 400:
+        response.close()
+        raise DownloadError(f"HTTP {response.status_code} while downloading the file.")
+
+    return response
+
+def _with_retries(fn, deadline):
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            return fn()
+        except (_RetryableError, requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise DownloadError(f"Download failed after {attempt + 1} attempts.({e})") from e
+            delay = DOWNLOAD_BACKOFF_MS / 1000 * 2 ** attempt
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise DownloadError(f"Download timed out.({e})") from e
+            print(f">>> [INFO] Download interrupted ({e}). Retrying in {delay:.1f}s...", flush=True)
+            time.sleep(delay)
+
+def _probe_size(url, deadline):
+    with _get(url, deadline, {"Range": "bytes=0-0"}) as response:
+        if response.status_code != 206:
+            return None
+        match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+
+    return int(match.group(1)) if match else None
+
+def _fetch_range(url, target, start, stop, deadline, failed):
+    position = start
+
+    def attempt():
+        nonlocal position
+        with _get(url, deadline, {"Range": f"bytes={position}-{stop - 1}"}) as response:
+            if response.status_code != 206:
+                raise DownloadError("Server ignored the range request.")
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                if failed.is_set():
+                    return
+                _read_timeout(deadline)
+                target.write_at(position, chunk)
+                position += len(chunk)
+        if position < stop:
+            raise _RetryableError(f"Connection closed at byte {position} of {stop}")
+
+    try:
+        _with_retries(attempt, deadline)
+    except Exception:
+        failed.set()
+        raise
+
+def _fetch_stream(url, target, deadline):
+    def attempt():
+        target.reset()
+        position = 0
+        with _get(url, deadline) as response:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                _read_timeout(deadline)
+                target.write_at(position, chunk)
+                position += len(chunk)
+
+    _with_retries(attempt, deadline)
+
+def download_file_from_presigned_url(url, save_path=None, timeout=None):
     if not url:
-        print(">>> [Error] Invalid URL.")
-        return
+        raise DownloadError("Invalid URL.")
+
+    deadline = time.monotonic() + timeout if timeout else None
+    size = _with_retries(lambda: _probe_size(url, deadline), deadline)
 
+    target = _Target(save_path, size or 0)
     try:
-        with requests.get(url, stream=True) as response:
-            response.raise_for_status()
-
-            with open(save_path, 'wb') as f:
-                chunk_size = 8192
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    f.write(chunk)
-
-    except requests.exceptions.HTTPError as http_err:
-        print(f">>>[Error] {http_err}")
-    except requests.exceptions.ConnectionError as conn_err:
-        print(f">>>[Error] {conn_err}")
-    except requests.exceptions.RequestException as req_err:
-        print(f">>>[Error] {req_err}")
-    except Exception as e:
-        print(f">>>[Error] {e}")
\ No newline at end of file
+        if size is None:
+            _fetch_stream(url, target, deadline)
+        elif size > 0:
+            parts = max(1, min(DOWNLOAD_PARTS, math.ceil(size / DOWNLOAD_PART_BYTES)))
+            part_size = math.ceil(size / parts)
+            ranges = [(start, min(start + part_size, size)) for start in range(0, size, part_size)]
+            failed = threading.Event()
+            if len(ranges) == 1:
+                _fetch_range(url, target, 0, size, deadline, failed)
+            else:
+                with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                    futures = [executor.submit(_fetch_range, url, target, start, stop, deadline, failed)
+                               for start, stop in ranges]
+                    for future in futures:
+                        future.result()
+    finally:
+        target.close()
+
+    return save_path if save_path is not None else target.buffer
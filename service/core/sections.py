@@ -0,0 +1,88 @@
+import re
+
+class HeaderParser:
+    def __init__(self):
+        self.patterns = {
+            'part': re.compile(r'^(Part|PART)\s*([IVX0-9]+|[A-Z])\s*(.*)', re.IGNORECASE),
+            'chapter': re.compile(r'^(Chapter|CHAPTER)\s*([0-9]+)\s*(.*)', re.IGNORECASE),
+            'section_explicit': re.compile(r'^(Section|§)\s*([0-9]+)\s*(.*)', re.IGNORECASE),
+            'section_numeric': re.compile(r'^([0-9]+\.[0-9]+)\s+(.*)'),
+            'special': re.compile(r'^(Preface|Contents|Index|Bibliography|Appendix|Problems|Notes|Exercises)',
+                                  re.IGNORECASE)
+        }
+
+        self.state = {
+            'part': None,
+            'chapter': None,
+            'section_num': None,
+            'section_title': None
+        }
+
+    def _get_priority(self, text):
+        if self.patterns['part'].match(text): return 1
+        if self.patterns['chapter'].match(text): return 2
+        return 3
+
+    def feed_page(self, header_list):
+        if not header_list:
+            return self._format_output()
+
+        sorted_headers = sorted(header_list, key=lambda x: self._get_priority(x))
+
+        for text in sorted_headers:
+            clean_text = text.strip()
+
+            if self.patterns['part'].match(clean_text):
+                self.state['part'] = clean_text
+                continue
+
+            if self.patterns['chapter'].match(clean_text):
+                self.state['chapter'] = clean_text
+                self.state['section_num'] = None
+                self.state['section_title'] = None
+                continue
+
+            sec_num, sec_title = None, None
+
+            m_sec_exp = self.patterns['section_explicit'].match(clean_text)
+            m_sec_num = self.patterns['section_numeric'].match(clean_text)
+
+            if m_sec_exp:
+                sec_num = m_sec_exp.group(2)
+                sec_title = m_sec_exp.group(3).strip()
+            elif m_sec_num:
+                sec_num = m_sec_num.group(1)
+                sec_title = m_sec_num.group(2).strip()
+
+            if sec_num:
+                if (self.state['section_num'] != sec_num) or \
+                        (sec_title and (
+                                not self.state['section_title'] or len(sec_title) > len(self.state['section_title']))):
+                    self.state['section_num'] = sec_num
+                    self.state['section_title'] = sec_title
+                continue
+
+            if self.patterns['special'].match(clean_text):
+                self.state['section_title'] = clean_text
+
+        return self._format_output()
+
+    def _format_output(self):
+        full_title = self.state['section_num'] if self.state['section_num'] else ""
+
+        return full_title
+
+def assign_sections(layout_pages):
+    parser = HeaderParser()
+    previous_headers = []
+    for page in sorted(layout_pages, key=lambda p: p['page_index']):
+        headers = page.get('headers', [])
+        page_section = parser.feed_page(previous_headers + headers)
+        for box in page['boxes']:
+            if page_section != "":
+                box['section_info'] = page_section
+            else:
+                box.pop('section_info', None)
+        previous_headers = headers
+
+    return layout_pages
@@ -0,0 +1,69 @@
+import fitz
+import threading
+import unicodedata
+from service.core.raster import open_pdf
+
+WORD_FLAGS = fitz.TEXTFLAGS_WORDS & ~fitz.TEXT_PRESERVE_LIGATURES
+MIN_PAGE_WORDS = 10
+MAX_BAD_CHAR_RATIO = 0.02
+MIN_ALPHA_RATIO = 0.5
+
+def _is_bad_char(char):
+    return char == "�" or unicodedata.category(char) in ("Co", "Cc", "Cs")
+
+def is_trustworthy(words):
+    if len(words) < MIN_PAGE_WORDS:
+        return False
+
+    chars = "".join(word[4] for word in words)
+    if not chars:
+        return False
+    bad = sum(1 for char in chars if _is_bad_char(char))
+    alpha = sum(1 for char in chars if char.isalpha())
+
+    return bad / len(chars) <= MAX_BAD_CHAR_RATIO and alpha / len(chars) >= MIN_ALPHA_RATIO
+
+class TextLayer:
+    def __init__(self, source):
+        self.doc = open_pdf(source)
+        self._lock = threading.Lock()
+
+    def page_words(self, page_index):
+        with self._lock:
+            page = self.doc.load_page(page_index)
+            words = page.get_text("words", flags=WORD_FLAGS)
+            if not is_trustworthy(words):
+                return None
+
+            matrix = page.rotation_matrix
+            width, height = page.rect.width, page.rect.height
+
+        return {
+            "width": width,
+            "height": height,
+            "words": [(fitz.Rect(word[:4]) * matrix, word[4], word[5], word[6]) for word in words]
+        }
+
+    def box_lines(self, page_words, coord):
+        box = fitz.Rect(coord[0] * page_words["width"], coord[1] * page_words["height"],
+                        coord[2] * page_words["width"], coord[3] * page_words["height"])
+
+        lines = {}
+        for rect, text, block_no, line_no in page_words["words"]:
+            center = fitz.Point((rect.x0 + rect.x1) / 2, (rect.y0 + rect.y1) / 2)
+            if not box.contains(center):
+                continue
+            if (block_no, line_no) in lines:
+                line_rect, line_words = lines[(block_no, line_no)]
+                lines[(block_no, line_no)] = (line_rect | rect, line_words + [text])
+            else:
+                lines[(block_no, line_no)] = (fitz.Rect(rect), [text])
+
+        if not lines:
+            return None
+
+        return {"rec_texts": [" ".join(line_words) for _, line_words in lines.values()],
+                "rec_boxes": [[r.x0, r.y0, r.x1, r.y1] for r, _ in lines.values()]}
+
+    def close(self):
+        self.doc.close()
@@ -0,0 +1,9 @@
+import spacy
+from functools import lru_cache
+
+# token2features only reads lexical attributes plus tag_ (tagger) and pos_ (attribute_ruler)
+EXCLUDED_COMPONENTS = ["parser", "ner", "lemmatizer", "senter"]
+
+@lru_cache(maxsize=None)
+def load_nlp(model_name="en_core_web_sm"):
+    return spacy.load(model_name, exclude=EXCLUDED_COMPONENTS)
@@ -1,8 +1,11 @@
-import spacy, joblib, re
+import joblib, re
+from collections import Counter
 from pathlib import Path
+from service.settings import NLP_BATCH_SIZE, NLP_PROCESSES
+from service.models.nlp import load_nlp
 
 MODEL_FILE = Path(__file__).parent/'artifacts'/'figure_model.joblib'
-nlp = spacy.load("en_core_web_sm")
+nlp = load_nlp()
 crf = joblib.load(MODEL_FILE)
 
 def token2features(doc, i):
@@ -150,16 +153,7 @@ def preprocess_for_inference(text):
 
     return text
 
-def predict_from_text(text, crf_model=crf):
-    processed_text = preprocess_for_inference(text)
-    doc = nlp(processed_text)
-
-    features = [token2features(doc, i) for i in range(len(doc))]
-    tokens = [token.text for token in doc]
-    if not features:
-        return ReferenceInfo(), [], []
-
-    predicted_tags = crf_model.predict([features])[0]
+def _select_references(text, tokens, predicted_tags):
     spans = tags_to_spans(tokens, predicted_tags)
 
     new_ref_info = []
@@ -178,8 +172,63 @@ def predict_from_text(text, crf_model=crf):
     if spans.ref_info or spans.section_info:
         spans.raw_texts.append(text)
 
+    return spans
+
+def predict_from_text(text, crf_model=crf):
+    processed_text = preprocess_for_inference(text)
+    doc = nlp(processed_text)
+
+    features = [token2features(doc, i) for i in range(len(doc))]
+    tokens = [token.text for token in doc]
+    if not features:
+        return ReferenceInfo(), [], []
+
+    predicted_tags = crf_model.predict([features])[0]
+    spans = _select_references(text, tokens, predicted_tags)
+
     return spans, tokens, predicted_tags
 
+REFERENCE_KEYWORDS = re.compile(r'\b(?:fig|table|formula|algorithm|chart|eq)', re.IGNORECASE)
+prefilter_stats = Counter()
+
+def may_contain_reference(text):
+    return REFERENCE_KEYWORDS.search(text) is not None
+
+def prefilter_skip_rate(since=None):
+    stats = prefilter_stats - since if since is not None else prefilter_stats
+    if not stats['checked']:
+        return 0.0
+    return stats['skipped'] / stats['checked']
+
+def predict_from_texts(texts, crf_model=crf, batch_size=NLP_BATCH_SIZE, n_process=NLP_PROCESSES, prefilter=True):
+    outputs = [ReferenceInfo() for _ in texts]
+
+    candidates = list(range(len(texts)))
+    if prefilter:
+        candidates = [i for i in candidates if may_contain_reference(texts[i])]
+        prefilter_stats['checked'] += len(texts)
+        prefilter_stats['skipped'] += len(texts) - len(candidates)
+    if not candidates:
+        return outputs
+
+    processed_texts = [preprocess_for_inference(texts[i]) for i in candidates]
+
+    features = []
+    tokens = []
+    for doc in nlp.pipe(processed_texts, batch_size=batch_size, n_process=n_process):
+        features.append([token2features(doc, i) for i in range(len(doc))])
+        tokens.append([token.text for token in doc])
+
+    indices = [i for i, f in enumerate(features) if f]
+    if not indices:
+        return outputs
+
+    predicted_tags = crf_model.predict([features[i] for i in indices])
+    for i, tags in zip(indices, predicted_tags):
+        outputs[candidates[i]] = _select_references(texts[candidates[i]], tokens[i], tags)
+
+    return outputs
+
 if __name__ == '__main__':
     output, _, _ = predict_from_text("For instance, as shown in Table 1, exploits known to the public annotated with a checkmark do so with the brute-force attack", joblib.load(MODEL_FILE))
     print(output)
\ No newline at end of file
@@ -0,0 +1,38 @@
+import os, tempfile
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent/"data"
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+PAGE_CACHE_BYTES = _env_int("OCR_PAGE_CACHE_BYTES", 1024 * 1024 * 1024)
+RENDER_WORKERS = _env_int("OCR_RENDER_WORKERS", min(4, os.cpu_count() or 1))
+RENDER_CHUNK_PAGES = _env_int("OCR_RENDER_CHUNK_PAGES", 8)
+RENDER_MAX_IN_FLIGHT = _env_int("OCR_RENDER_MAX_IN_FLIGHT", 32)
+OCR_BATCH_SIZE = _env_int("OCR_BATCH_SIZE", 16)
+INFERENCE_WORKERS = _env_int("OCR_INFERENCE_WORKERS", 1)
+JOB_WORKERS = _env_int("OCR_JOB_WORKERS", INFERENCE_WORKERS)
+SHARD_MIN_PAGES = _env_int("OCR_SHARD_MIN_PAGES", 100)
+JOB_QUEUE_SIZE = _env_int("OCR_JOB_QUEUE_SIZE", 16)
+JOB_RETENTION = _env_int("OCR_JOB_RETENTION", 256)
+RESULT_CACHE_DIR = Path(os.getenv("OCR_RESULT_CACHE_DIR", DATA_DIR/"cache"/"results"))
+RESULT_CACHE_BYTES = _env_int("OCR_RESULT_CACHE_BYTES", 2 * 1024 * 1024 * 1024)
+CHECKPOINT_DIR = Path(os.getenv("OCR_CHECKPOINT_DIR", DATA_DIR/"cache"/"checkpoints"))
+CHECKPOINT_TTL = _env_int("OCR_CHECKPOINT_TTL", 7 * 24 * 60 * 60)
+NLP_BATCH_SIZE = _env_int("OCR_NLP_BATCH_SIZE", 256)
+NLP_PROCESSES = _env_int("OCR_NLP_PROCESSES", 1)
+SEGMENTATION_CACHE_SIZE = _env_int("OCR_SEGMENTATION_CACHE_SIZE", 65536)
+CORRECTION_MODE = os.getenv("OCR_CORRECTION_MODE", "sentence")
+SYMSPELL_INDEX_DIR = Path(os.getenv("OCR_SYMSPELL_INDEX_DIR", DATA_DIR/"cache"/"symspell"))
+TEXT_LAYER = os.getenv("OCR_TEXT_LAYER", "auto")
+SPOOL_DIR = Path(os.getenv("OCR_SPOOL_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()))
+DOWNLOAD_CHUNK_BYTES = _env_int("OCR_DOWNLOAD_CHUNK_BYTES", 1024 * 1024)
+DOWNLOAD_PARTS = _env_int("OCR_DOWNLOAD_PARTS", 8)
+DOWNLOAD_PART_BYTES = _env_int("OCR_DOWNLOAD_PART_BYTES", 8 * 1024 * 1024)
+DOWNLOAD_RETRIES = _env_int("OCR_DOWNLOAD_RETRIES", 3)
+DOWNLOAD_BACKOFF_MS = _env_int("OCR_DOWNLOAD_BACKOFF_MS", 500)
+DOWNLOAD_READ_TIMEOUT = _env_int("OCR_DOWNLOAD_READ_TIMEOUT", 60)
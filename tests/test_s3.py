@@ -0,0 +1,128 @@
+import os, re, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import service.core.s3 as s3
+
+DATA = os.urandom(1024 * 1024 + 123)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        state = self.server.state
+        with state["lock"]:
+            state["requests"].append(self.headers.get("Range"))
+            fail = state["fail_status"].pop(0) if state["fail_status"] else None
+            truncate = state["truncate"] > 0 and self.headers.get("Range") != "bytes=0-0"
+            if truncate:
+                state["truncate"] -= 1
+
+        if fail:
+            return self._send_empty(fail)
+
+        rng = self.headers.get("Range")
+        if rng and state["ranges"]:
+            start, stop = map(int, re.match(r"bytes=(\d+)-(\d+)", rng).groups())
+            body = DATA[start:stop + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{start + len(body) - 1}/{len(DATA)}")
+        else:
+            body = DATA
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if state["delay"]:
+            time.sleep(state["delay"])
+        if truncate:
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(s3, "DOWNLOAD_PART_BYTES", 128 * 1024)
+    monkeypatch.setattr(s3, "DOWNLOAD_PARTS", 4)
+    monkeypatch.setattr(s3, "DOWNLOAD_BACKOFF_MS", 1)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.state = {"lock": threading.Lock(), "requests": [], "ranges": True,
+                   "fail_status": [], "truncate": 0, "delay": 0}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{httpd.server_port}/book.pdf?X-Amz-Signature=test", httpd.state
+
+    httpd.shutdown()
+    httpd.server_close()
+
+def _ranged_parts(state):
+    return [r for r in state["requests"] if r and r != "bytes=0-0"]
+
+def test_ranged_download_into_memory(server):
+    url, state = server
+
+    data = s3.download_file_from_presigned_url(url)
+
+    assert bytes(data) == DATA
+    assert len(_ranged_parts(state)) == 4
+
+def test_ranged_download_into_file(server, tmp_path):
+    url, state = server
+    path = tmp_path/"book.pdf"
+
+    assert s3.download_file_from_presigned_url(url, path, timeout=30) == path
+    assert path.read_bytes() == DATA
+    assert len(_ranged_parts(state)) == 4
+
+def test_falls_back_when_range_is_ignored(server):
+    url, state = server
+    state["ranges"] = False
+
+    assert bytes(s3.download_file_from_presigned_url(url)) == DATA
+    assert _ranged_parts(state) == []
+
+def test_retries_after_server_error(server):
+    url, state = server
+    state["fail_status"] = [503, 503]
+
+    assert bytes(s3.download_file_from_presigned_url(url)) == DATA
+    assert state["requests"][:3] == ["bytes=0-0"] * 3
+
+def test_resumes_truncated_part(server):
+    url, state = server
+    state["truncate"] = 2
+
+    assert bytes(s3.download_file_from_presigned_url(url)) == DATA
+    assert len(_ranged_parts(state)) == 6
+
+def test_client_error_raises_without_retry(server):
+    url, state = server
+    state["fail_status"] = [403]
+
+    with pytest.raises(s3.DownloadError, match="403"):
+        s3.download_file_from_presigned_url(url)
+    assert len(state["requests"]) == 1
+
+def test_deadline_raises(server):
+    url, state = server
+    state["delay"] = 2
+
+    started = time.monotonic()
+    with pytest.raises(s3.DownloadError, match="timed out"):
+        s3.download_file_from_presigned_url(url, timeout=0.5)
+    assert time.monotonic() - started < 1.5
+
+def test_empty_url_raises():
+    with pytest.raises(s3.DownloadError):
+        s3.download_file_from_presigned_url("")